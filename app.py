@@ -25,6 +25,7 @@ from undo_redo_mixin import UndoRedoMixin
 from stats_progress_mixin import StatsProgressMixin
 from settings_mixin import SettingsMixin
 from ui_queue_mixin import UIQueueMixin
+from hashing import DEFAULT_ALGORITHM
 
 
 class SmartOrganizerApp(
@@ -74,6 +75,7 @@ class SmartOrganizerApp(
         self.dry_run = tk.BooleanVar(value=False)
         self.include_hidden = tk.BooleanVar(value=False)
         self.compute_duplicates = tk.BooleanVar(value=False)
+        self.hash_algorithm = tk.StringVar(value=DEFAULT_ALGORITHM)
 
         self.include_suffixes = tk.StringVar()
 
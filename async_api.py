@@ -0,0 +1,230 @@
+"""
+Asyncio front end: sort, undo and redo as coroutines and async event streams.
+
+Why this exists:
+sort_directory, undo and redo block for as long as the filesystem
+work takes, so services running on an event loop had to push each
+whole call into an executor themselves -- with no progress until it
+returned, no way to stop it, and nothing limiting how many ran at
+once.
+
+AsyncOrganizer runs them for one event loop:
+
+  - the blocking work runs on a bounded thread pool, and a semaphore
+    limits how many operations run at once (`concurrency`); the rest
+    wait their turn without holding a thread
+  - operations on the same destination root run one at a time, since
+    they share its history; different roots run concurrently
+  - sort_events() steps file_sorter.iter_sort() on the pool a batch at
+    a time and yields its events (events.py) as an async iterator; the
+    sort doesn't advance while the consumer is busy, so a slow consumer
+    holds back the sort instead of piling up events
+  - undo_events() / redo_events() yield Progress events (throttled
+    progress.ProgressEvents, phase "undoing" / "redoing")
+  - every stream ends with Finished(result); sort() / undo() / redo()
+    run a stream to the end and return that result
+
+Cancelling the task (or closing a stream early) stops the operation
+the way file_sorter does it: moves under way finish, a sort records
+what it moved so far for Undo, and an undo/redo leaves its intent log
+for the next undo()/redo() to resume. The cancellation completes once
+that has happened, so the tree is consistent when the task ends. A
+sort stops at its next yield point (see iter_sort): every file or
+progress tick with `pipeline=True`, after the current phase otherwise.
+
+    async with AsyncOrganizer(concurrency=4) as organizer:
+        summaries = await asyncio.gather(*(organizer.sort(root) for root in roots))
+
+        async for event in organizer.sort_events(root, events=(Progress, Finished)):
+            ...
+"""
+
+import asyncio
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import Executor, ThreadPoolExecutor
+from pathlib import Path
+from typing import AsyncIterator, Callable, Iterator, List, Optional, Tuple
+
+from events import EVENT_TYPES, Finished, Progress, SortEvent
+from file_sorter import iter_sort, redo, undo
+from progress import ReplayProgress
+
+DEFAULT_CONCURRENCY = 4
+
+# sort_events() hands events over in batches of at most this many, or
+# whatever the sort produced in this many seconds, to keep the
+# per-event cost of crossing threads low.
+BATCH_EVENTS = 256
+BATCH_SECONDS = 0.05
+
+_DONE = object()
+
+
+def _advance(gen: Iterator[SortEvent], lock: threading.Lock) -> Tuple[List[SortEvent], bool]:
+    """The next batch of events from `gen`, and whether it is exhausted."""
+    batch: List[SortEvent] = []
+    with lock:
+        deadline = time.monotonic() + BATCH_SECONDS
+        for event in gen:
+            batch.append(event)
+            if len(batch) >= BATCH_EVENTS or time.monotonic() >= deadline:
+                return batch, False
+    return batch, True
+
+
+def _close(gen: Iterator[SortEvent], lock: threading.Lock):
+    # Waits for a batch still running on another thread; a generator
+    # can't be closed while it executes.
+    with lock:
+        gen.close()
+
+
+class AsyncOrganizer:
+
+    def __init__(self, concurrency: int = DEFAULT_CONCURRENCY, executor: Optional[Executor] = None):
+        self.concurrency = max(1, int(concurrency or 1))
+        self._owns_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="organizer"
+        )
+        # Created on first use, inside the loop that uses it.
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._root_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    async def __aenter__(self) -> "AsyncOrganizer":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Shut down the thread pool, if this organizer created it."""
+        if self._owns_executor:
+            self._executor.shutdown(wait=False)
+
+    def _slot(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    def _root_lock(self, root: Path) -> asyncio.Lock:
+        key = os.path.normcase(os.path.abspath(root))
+        lock = self._root_locks.get(key)
+        if lock is None:
+            lock = self._root_locks[key] = asyncio.Lock()
+        return lock
+
+    # ----------------------------------------------------
+    # SORT
+    # ----------------------------------------------------
+
+    async def sort_events(self, root_dir: Path, **options) -> AsyncIterator[SortEvent]:
+        """
+        file_sorter.iter_sort() as an async iterator; `options` are its
+        arguments (`events=` included). Ends with Finished(summary).
+        """
+        root_dir = Path(root_dir)
+        loop = asyncio.get_running_loop()
+        dest_root = Path(options.get("dest_root") or root_dir)
+        wanted = set(EVENT_TYPES if options.get("events") is None else options["events"])
+        # Progress ticks give a cancelled sort a point to stop at even
+        # when the caller asked for few events; unwanted ones are dropped.
+        hide_progress = Progress not in wanted
+        options["events"] = wanted | {Progress}
+        async with self._root_lock(dest_root), self._slot():
+            gen = iter_sort(root_dir, **options)
+            lock = threading.Lock()
+            exhausted = False
+            try:
+                while not exhausted:
+                    batch, exhausted = await loop.run_in_executor(self._executor, _advance, gen, lock)
+                    for event in batch:
+                        if hide_progress and type(event) is Progress:
+                            continue
+                        yield event
+            finally:
+                if not exhausted:
+                    # Cancelled or closed early: stop the sort and wait
+                    # until what it moved is recorded.
+                    await asyncio.shield(loop.run_in_executor(self._executor, _close, gen, lock))
+
+    async def sort(self, root_dir: Path, **options) -> dict:
+        """sort_directory() as a coroutine; returns its summary."""
+        summary = None
+        async for event in self.sort_events(root_dir, **dict(options, events=(Finished,))):
+            summary = event.summary
+        return summary
+
+    # ----------------------------------------------------
+    # UNDO / REDO
+    # ----------------------------------------------------
+
+    async def _replay_events(self, func: Callable[..., dict], phase: str, dest_root: Path,
+                             workers: int) -> AsyncIterator[SortEvent]:
+        dest_root = Path(dest_root)
+        loop = asyncio.get_running_loop()
+        async with self._root_lock(dest_root), self._slot():
+            events: "asyncio.Queue" = asyncio.Queue()
+
+            def post(item):
+                try:
+                    loop.call_soon_threadsafe(events.put_nowait, item)
+                except RuntimeError:
+                    # The loop is closed; nobody is listening.
+                    pass
+
+            progress = ReplayProgress(lambda e: post(Progress(e)), phase)
+
+            def run() -> dict:
+                try:
+                    result = func(dest_root, workers, progress, stop)
+                    progress.finish(result.get("undone", result.get("redone", 0)))
+                    return result
+                finally:
+                    post(_DONE)
+
+            stop = threading.Event()
+            future = loop.run_in_executor(self._executor, run)
+            try:
+                while True:
+                    event = await events.get()
+                    if event is _DONE:
+                        break
+                    yield event
+                result = await future
+            except BaseException:
+                # Cancelled or closed early: stop the replay and wait
+                # until its intent log is checkpointed.
+                stop.set()
+                if not future.done():
+                    try:
+                        await asyncio.shield(future)
+                    except Exception:
+                        pass
+                raise
+            yield Finished(result)
+
+    def undo_events(self, dest_root: Path, workers: int = 1) -> AsyncIterator[SortEvent]:
+        """file_sorter.undo() as Progress events, then Finished(result)."""
+        return self._replay_events(undo, "undoing", dest_root, workers)
+
+    def redo_events(self, dest_root: Path, workers: int = 1) -> AsyncIterator[SortEvent]:
+        """file_sorter.redo() as Progress events, then Finished(result)."""
+        return self._replay_events(redo, "redoing", dest_root, workers)
+
+    async def undo(self, dest_root: Path, workers: int = 1) -> dict:
+        return await _finished(self.undo_events(dest_root, workers))
+
+    async def redo(self, dest_root: Path, workers: int = 1) -> dict:
+        return await _finished(self.redo_events(dest_root, workers))
+
+
+async def _finished(stream: AsyncIterator[SortEvent]) -> dict:
+    result = None
+    async for event in stream:
+        if isinstance(event, Finished):
+            result = event.summary
+    return result
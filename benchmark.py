@@ -0,0 +1,246 @@
+"""
+Benchmark suite for the sorter's hot paths.
+
+Why this exists:
+There was no way to tell whether a change made sort_directory, the
+duplicate pass or undo/redo faster or slower. This script builds
+deterministic synthetic trees in a temp directory, times each phase
+on them and writes the numbers as JSON, so two commits can be
+compared on the same machine:
+
+    python benchmark.py --out before.json
+    (change something)
+    python benchmark.py --out after.json --compare before.json
+
+Scenarios (all sizes scale with --scale):
+  small_files  many 1-8 KiB files with mixed extensions, shallow tree
+  deep         the same kind of files spread over deeply nested folders
+  collisions   few distinct names repeated across folders, sorted flat
+               (preserve_structure=False) so most targets collide
+  duplicates   a configurable share of files are byte copies of others
+  large        a handful of multi-MiB files (hashing / copy throughput)
+
+Phases timed per scenario: sort, duplicates (cold, then warm with the
+hash cache, both on the same sorted tree), undo and redo. The tree contents depend only on --seed,
+so results are comparable across runs and machines.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from file_sorter import sort_directory, undo, redo
+
+EXTENSIONS = (".jpg", ".png", ".pdf", ".txt", ".docx", ".mp3", ".mp4", ".zip", ".py", ".csv", ".bin", ".tar.gz")
+
+SCENARIOS = {
+    "small_files": {"files": 5000, "dirs": 50, "depth": 2, "min_size": 1024, "max_size": 8192},
+    "deep": {"files": 3000, "dirs": 300, "depth": 12, "min_size": 1024, "max_size": 8192},
+    "collisions": {"files": 3000, "dirs": 300, "depth": 2, "min_size": 512, "max_size": 2048,
+                   "names": 20, "flat": True},
+    "duplicates": {"files": 3000, "dirs": 30, "depth": 2, "min_size": 4096, "max_size": 65536,
+                   "duplicate_ratio": 0.3},
+    "large": {"files": 12, "dirs": 3, "depth": 1, "min_size": 16 << 20, "max_size": 48 << 20,
+              "duplicate_ratio": 0.25},
+}
+
+# Random bytes are expensive to generate; file bodies are slices of one
+# seeded block, varied per file by a unique header.
+_BLOCK_SIZE = 1 << 20
+
+
+def generate_tree(root: Path, spec: dict, seed: int = 0, scale: float = 1.0) -> dict:
+    """
+    Build the synthetic tree for `spec` under `root`. The same spec,
+    seed and scale always give the same paths and bytes. Returns
+    {"files", "bytes", "duplicates"}.
+    """
+    rng = random.Random(seed)
+    block = rng.randbytes(_BLOCK_SIZE) if hasattr(rng, "randbytes") else bytes(
+        rng.getrandbits(8) for _ in range(_BLOCK_SIZE)
+    )
+    n_files = max(1, int(spec["files"] * scale))
+    n_dirs = max(1, int(spec["dirs"] * scale))
+
+    dirs = []
+    for d in range(n_dirs):
+        depth = rng.randint(1, spec["depth"])
+        dirs.append(root.joinpath(*(f"d{d}_{level}" for level in range(depth))))
+
+    names = spec.get("names")
+    dup_ratio = spec.get("duplicate_ratio", 0.0)
+    written: List[Path] = []
+    total = dups = 0
+    for i in range(n_files):
+        directory = dirs[rng.randrange(n_dirs)]
+        directory.mkdir(parents=True, exist_ok=True)
+        ext = rng.choice(EXTENSIONS)
+        stem = f"file{rng.randrange(names)}" if names else f"file{i}"
+        path = directory / f"{stem}{ext}"
+        if path.exists():
+            path = directory / f"{stem}_{i}{ext}"
+        if written and rng.random() < dup_ratio:
+            shutil.copyfile(written[rng.randrange(len(written))], path)
+            dups += 1
+        else:
+            size = rng.randint(spec["min_size"], spec["max_size"])
+            header = f"{seed}:{i}\n".encode()
+            offset = rng.randrange(_BLOCK_SIZE)
+            with path.open("wb") as fh:
+                fh.write(header)
+                remaining = size - len(header)
+                while remaining > 0:
+                    chunk = block[offset:offset + remaining]
+                    fh.write(chunk)
+                    remaining -= len(chunk)
+                    offset = 0
+        written.append(path)
+        total += path.stat().st_size
+    return {"files": len(written), "bytes": total, "duplicates": dups}
+
+
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def run_scenario(name: str, spec: dict, workdir: Path, seed: int, scale: float, workers: int) -> dict:
+    root = workdir / name
+    root.mkdir()
+    tree = generate_tree(root, spec, seed, scale)
+    preserve = not spec.get("flat", False)
+    phases: Dict[str, float] = {}
+
+    phases["sort"], summary = _timed(
+        sort_directory, root, preserve_structure=preserve, workers=workers
+    )
+    # Cold: the hash cache is still empty, so everything is hashed (and
+    # cached). Undone untimed, so the warm run gets the same tree and
+    # duplicates to move, with every digest already cached.
+    phases["duplicates_cold"], _ = _timed(
+        sort_directory, root, preserve_structure=preserve, workers=workers,
+        compute_duplicates=True
+    )
+    undo(root)
+    phases["duplicates_warm"], dup_summary = _timed(
+        sort_directory, root, preserve_structure=preserve, workers=workers,
+        compute_duplicates=True
+    )
+    # The warm run is a history entry too; step back over it so
+    # undo/redo time the original sort.
+    undo(root)
+    phases["undo"], undo_result = _timed(undo, root, workers=workers)
+    phases["redo"], _ = _timed(redo, root, workers=workers)
+
+    return {
+        "files": tree["files"],
+        "bytes": tree["bytes"],
+        "moved": summary["moved_count"],
+        "duplicates_found": dup_summary.get("duplicate_count", 0),
+        "undone": undo_result.get("undone", 0),
+        "phases": phases,
+        "sort_files_per_second": tree["files"] / phases["sort"] if phases["sort"] else 0.0,
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).resolve().parent,
+            capture_output=True, text=True, timeout=10,
+        )
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def run_all(names: List[str], seed: int, scale: float, repeat: int, workers: int, keep: bool) -> dict:
+    results = {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "timestamp": time.time(),
+            "seed": seed,
+            "scale": scale,
+            "repeat": repeat,
+            "workers": workers,
+        },
+        "scenarios": {},
+    }
+    for name in names:
+        runs = []
+        for _ in range(repeat):
+            workdir = Path(tempfile.mkdtemp(prefix="organizer-bench-"))
+            try:
+                runs.append(run_scenario(name, SCENARIOS[name], workdir, seed, scale, workers))
+            finally:
+                if keep:
+                    print(f"kept {workdir}", file=sys.stderr)
+                else:
+                    shutil.rmtree(workdir, ignore_errors=True)
+        # Best of N: the least disturbed run is the most comparable one.
+        best = dict(runs[0])
+        best["phases"] = {p: min(r["phases"][p] for r in runs) for p in runs[0]["phases"]}
+        best["sort_files_per_second"] = best["files"] / best["phases"]["sort"] if best["phases"]["sort"] else 0.0
+        results["scenarios"][name] = best
+        print(f"{name:12s} " + "  ".join(f"{p} {t:.3f}s" for p, t in best["phases"].items()), file=sys.stderr)
+    return results
+
+
+def compare(current: dict, baseline: dict) -> List[str]:
+    """Lines of "scenario phase: old -> new (ratio)" for phases in both."""
+    lines = []
+    for name, scen in current["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        for phase, t in scen["phases"].items():
+            old = base["phases"].get(phase)
+            if old:
+                lines.append(f"{name:12s} {phase:16s} {old:8.3f}s -> {t:8.3f}s  ({t / old:5.2f}x)")
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark sort / duplicates / undo / redo on synthetic trees")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="Run only these scenarios (repeatable)")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply file and folder counts (default: 1.0)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the synthetic trees (default: 0)")
+    parser.add_argument("--repeat", type=int, default=1, metavar="N", help="Run each scenario N times and keep the best (default: 1)")
+    parser.add_argument("--jobs", type=int, default=1, metavar="N", help="Worker threads for moves / undo / redo")
+    parser.add_argument("--out", metavar="FILE", help="Write results as JSON to FILE (default: stdout)")
+    parser.add_argument("--compare", metavar="FILE", help="Print a comparison against an earlier results file")
+    parser.add_argument("--keep", action="store_true", help="Keep the generated trees for inspection")
+    args = parser.parse_args(argv)
+
+    names = args.scenario or list(SCENARIOS)
+    results = run_all(names, args.seed, args.scale, max(1, args.repeat), args.jobs, args.keep)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as fh:
+            baseline = json.load(fh)
+        for line in compare(results, baseline):
+            print(line, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
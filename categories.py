@@ -0,0 +1,164 @@
+"""
+Category rules: which folder a file is sorted into, based on its
+extension.
+
+Why this exists:
+`find_category_for_suffix` used to walk every list in a hardcoded
+FILE_CATEGORIES table for every single file, and the icon/preview
+code kept its own separate idea of what counts as an image. The
+CategoryRegistry builds a reverse suffix -> category index once, so
+a lookup costs the same whether there are 40 extensions or 4000, and
+it understands compound suffixes like `.tar.gz` (longest match wins).
+
+The registry is shared by file_sorter.py, icons.py and the preview
+grid. Users can add categories / remap extensions without touching
+code, either in organizer_settings.json or in a JSON file passed to
+`main.py --categories`:
+
+    {
+      "custom_categories": {"Ebooks": [".epub", ".mobi"]},
+      "extension_map": {".log": "Documents", ".tar.zst": "Archives"}
+    }
+"""
+
+import json
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_CATEGORIES: Dict[str, List[str]] = {
+    "Images": [".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tiff", ".webp", ".heic"],
+    "Documents": [".pdf", ".docx", ".doc", ".txt", ".odt", ".rtf"],
+    "Code": [".py", ".java", ".cpp", ".c", ".h", ".js", ".html", ".css", ".ts", ".go", ".rb"],
+    "Videos": [".mp4", ".mkv", ".avi", ".mov", ".wmv", ".flv"],
+    "Audio": [".mp3", ".wav", ".aac", ".ogg", ".flac"],
+    "Archives": [".zip", ".rar", ".tar", ".gz", ".7z", ".tgz", ".tar.gz", ".tar.bz2", ".tar.xz"],
+    "Spreadsheets": [".xls", ".xlsx", ".csv"],
+    "Presentations": [".ppt", ".pptx"]
+}
+UNKNOWN_CATEGORY = "Others"
+
+
+def _normalize_ext(ext: str) -> str:
+    ext = ext.strip().lower()
+    return ext if ext.startswith(".") else "." + ext
+
+
+class CategoryRegistry:
+
+    def __init__(self, categories: Optional[Dict[str, List[str]]] = None, unknown: str = UNKNOWN_CATEGORY):
+        self.unknown = unknown
+        self._categories: Dict[str, List[str]] = {}
+        self._index: Dict[str, str] = {}
+        self._max_dots = 1
+        for name, exts in (categories if categories is not None else DEFAULT_CATEGORIES).items():
+            self.add_category(name, exts)
+
+    # ----------------------------------------------------
+    # BUILDING
+    # ----------------------------------------------------
+
+    def add_category(self, name: str, extensions: Iterable[str] = ()):
+        self._categories.setdefault(name, [])
+        for ext in extensions:
+            ext = _normalize_ext(ext)
+            # First category to claim an extension keeps it, exactly
+            # like the old linear scan did.
+            if ext not in self._index:
+                self._map(ext, name)
+
+    def map_extension(self, ext: str, category: str):
+        """Force `ext` into `category`, overriding any earlier owner."""
+        ext = _normalize_ext(ext)
+        previous = self._index.get(ext)
+        if previous is not None and previous != category:
+            self._categories[previous].remove(ext)
+        self._categories.setdefault(category, [])
+        self._map(ext, category)
+
+    def _map(self, ext: str, category: str):
+        self._index[ext] = category
+        if ext not in self._categories[category]:
+            self._categories[category].append(ext)
+        self._max_dots = max(self._max_dots, ext.count("."))
+
+    def apply_config(self, data: dict):
+        """Merge `custom_categories` / `extension_map` from a settings dict."""
+        for name, exts in (data.get("custom_categories") or {}).items():
+            if isinstance(name, str) and name and isinstance(exts, list):
+                self.add_category(name, [e for e in exts if isinstance(e, str) and e.strip()])
+        for ext, category in (data.get("extension_map") or {}).items():
+            if isinstance(ext, str) and ext.strip() and isinstance(category, str) and category:
+                self.map_extension(ext, category)
+
+    # ----------------------------------------------------
+    # LOOKUP
+    # ----------------------------------------------------
+
+    @property
+    def names(self) -> List[str]:
+        """Every category folder name, including the unknown bucket."""
+        return list(self._categories.keys()) + [self.unknown]
+
+    def as_dict(self) -> Dict[str, List[str]]:
+        return {name: list(exts) for name, exts in self._categories.items()}
+
+    def category_for_suffix(self, suffix: str) -> str:
+        return self._index.get(suffix.lower(), self.unknown)
+
+    def category_for_name(self, name: str) -> str:
+        """Category for a file name; compound suffixes (`.tar.gz`) win over `.gz`."""
+        return self.match_name(name)[0]
+
+    def match_name(self, name: str) -> Tuple[str, Optional[str]]:
+        """(category, the suffix rule that matched -- None for the unknown bucket)."""
+        name = name.lower()
+        end = len(name)
+        dots = []
+        pos = end
+        while len(dots) < self._max_dots:
+            pos = name.rfind(".", 0, pos)
+            # A leading dot (".bashrc") is not an extension.
+            if pos <= 0:
+                break
+            dots.append(pos)
+        for pos in reversed(dots):
+            if pos < end - 1:
+                suffix = name[pos:]
+                cat = self._index.get(suffix)
+                if cat is not None:
+                    return cat, suffix
+        return self.unknown, None
+
+
+# ----------------------------------------------------
+# SHARED INSTANCE
+# ----------------------------------------------------
+
+_registry = CategoryRegistry()
+
+
+def get_registry() -> CategoryRegistry:
+    return _registry
+
+
+def set_registry(registry: CategoryRegistry):
+    global _registry
+    _registry = registry
+
+
+def configure_registry(data: Optional[dict] = None) -> CategoryRegistry:
+    """Rebuild the shared registry from the defaults plus `data` overrides."""
+    registry = CategoryRegistry()
+    if data:
+        registry.apply_config(data)
+    set_registry(registry)
+    return registry
+
+
+def read_config(path: Path) -> dict:
+    """Read a JSON file holding `custom_categories` / `extension_map` keys."""
+    with Path(path).open("r", encoding="utf-8") as fh:
+        data = json.load(fh)
+    if not isinstance(data, dict):
+        raise ValueError(f"{path}: expected a JSON object")
+    return data
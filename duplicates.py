@@ -0,0 +1,128 @@
+"""
+Staged duplicate matching.
+
+Why this exists:
+The duplicate pass used to group files by size and then SHA-256 every
+byte of every file in a same-size group. Two multi-GB videos that
+merely happen to share a size were read in full. DuplicateFinder
+narrows candidates in three stages, each cheaper than the next:
+
+  1. size          -- free, already known from the scan
+  2. sample hash   -- first + last SAMPLE_SIZE bytes only
+  3. full hash     -- only for files still colliding after stage 2
+
+Files no larger than two samples skip stage 2 (the sample would read
+the whole file anyway). `stats` records how many files reached each
+stage and how many bytes were read vs. what hashing every same-size
+candidate in full would have cost.
+
+With a HashCache, both sample and full digests are looked up before
+any file is opened; `bytes_hashed` only counts bytes actually read.
+Hashing within each stage runs on `workers` threads (see hashing.py).
+"""
+
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from walker import FileRecord
+from hash_cache import HashCache
+from hashing import (
+    DEFAULT_ALGORITHM, SAMPLE_SIZE, cached_digest, file_digest, full_kind,
+    hash_many, new_hasher, sample_digest, sample_kind,
+)
+
+
+class DuplicateFinder:
+
+    def __init__(
+        self,
+        sample_size: int = SAMPLE_SIZE,
+        cache: Optional[HashCache] = None,
+        algorithm: str = DEFAULT_ALGORITHM,
+        workers: int = 1,
+        on_hashed: Optional[Callable[[str, str], None]] = None,
+    ):
+        new_hasher(algorithm)  # fail fast on an unknown algorithm
+        self.sample_size = sample_size
+        self.cache = cache
+        self.algorithm = algorithm
+        self.workers = workers
+        # Called with (path, digest) for every full hash, in find()'s thread.
+        self.on_hashed = on_hashed
+        self.stats = {
+            "algorithm": algorithm,
+            "files_considered": 0,
+            "size_candidates": 0,
+            "sample_hashed": 0,
+            "full_hashed": 0,
+            "bytes_hashed": 0,
+            "bytes_full_scan": 0,
+            "bytes_avoided": 0,
+            "duplicate_groups": 0,
+        }
+
+    def _sample(self, rec: FileRecord) -> Tuple[str, bool]:
+        path = Path(rec.path)
+        return cached_digest(
+            path, sample_kind(self.sample_size, self.algorithm),
+            lambda: sample_digest(path, rec.size, self.sample_size, self.algorithm),
+            self.cache, rec.cache_key,
+        )
+
+    def _full(self, rec: FileRecord) -> Tuple[str, bool]:
+        path = Path(rec.path)
+        return cached_digest(
+            path, full_kind(self.algorithm),
+            lambda: file_digest(path, algorithm=self.algorithm),
+            self.cache, rec.cache_key,
+        )
+
+    def find(self, files: Iterable[FileRecord]) -> Dict[str, List[Path]]:
+        """Map full content hash -> every path with that content (2+ paths)."""
+        by_size: Dict[int, List[FileRecord]] = {}
+        for rec in files:
+            self.stats["files_considered"] += 1
+            by_size.setdefault(rec.size, []).append(rec)
+
+        # Each stage hashes all of its candidates in one batch, so the
+        # worker pool stays busy even when most groups are pairs.
+        need_full: List[FileRecord] = []
+        need_sample: List[FileRecord] = []
+        for size, group in by_size.items():
+            if len(group) < 2:
+                continue
+            self.stats["size_candidates"] += len(group)
+            self.stats["bytes_full_scan"] += size * len(group)
+            if size <= 2 * self.sample_size:
+                need_full.extend(group)
+            else:
+                need_sample.extend(group)
+
+        by_sample: Dict[Tuple[int, str], List[FileRecord]] = {}
+        for rec, (h, cached) in zip(need_sample, hash_many(self._sample, need_sample, self.workers)):
+            self.stats["sample_hashed"] += 1
+            if not cached:
+                self.stats["bytes_hashed"] += 2 * self.sample_size
+            if h:
+                by_sample.setdefault((rec.size, h), []).append(rec)
+        for survivors in by_sample.values():
+            if len(survivors) > 1:
+                need_full.extend(survivors)
+
+        result: Dict[str, List[Path]] = {}
+        by_hash: Dict[str, List[Path]] = {}
+        for rec, (h, cached) in zip(need_full, hash_many(self._full, need_full, self.workers)):
+            self.stats["full_hashed"] += 1
+            if not cached:
+                self.stats["bytes_hashed"] += rec.size
+            if h:
+                by_hash.setdefault(h, []).append(Path(rec.path))
+                if self.on_hashed is not None:
+                    self.on_hashed(rec.path, h)
+        for h, group in by_hash.items():
+            if len(group) > 1:
+                result[h] = group
+
+        self.stats["duplicate_groups"] = len(result)
+        self.stats["bytes_avoided"] = max(0, self.stats["bytes_full_scan"] - self.stats["bytes_hashed"])
+        return result
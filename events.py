@@ -0,0 +1,86 @@
+"""
+Typed events yielded by file_sorter.iter_sort().
+
+Why this exists:
+sort_directory only offered a `(processed, total)` callback while it
+ran and one large summary dict at the end, so the GUI worker, the CLI
+and services embedding the sorter either waited for the end or poked
+at callbacks fired from worker threads. iter_sort() yields these
+small __slots__ records as the run goes instead; a consumer handles
+each one and keeps only what it needs.
+
+  Scanned(path, size)            a file the walk found
+  Skipped(path, reason)          ... dropped by a filter ("suffix",
+                                 "min_size", "max_size")
+  Planned(src, dst, category)    its sort target, before collision renaming
+  Moved(kind, src, dst, moved)   a finished move; kind "move" or "duplicate"
+  MoveFailed(kind, src, dst, error)
+                                 a move that failed (continue_on_error=True)
+  Hashed(path, digest)           a file whose full content hash was needed
+  DuplicateFound(digest, original, duplicates)
+  Progress(event)                a throttled progress.ProgressEvent
+  PhaseTiming(phase, seconds)    a phase finished (see summary["timings"])
+  Finished(summary)              always last: the sort_directory summary
+"""
+
+from typing import Tuple
+
+
+class SortEvent:
+    __slots__: Tuple[str, ...] = ()
+
+    def __init__(self, *values):
+        if len(values) != len(self.__slots__):
+            raise TypeError(f"{type(self).__name__} takes {len(self.__slots__)} values, got {len(values)}")
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class Scanned(SortEvent):
+    __slots__ = ("path", "size")
+
+
+class Skipped(SortEvent):
+    __slots__ = ("path", "reason")
+
+
+class Planned(SortEvent):
+    __slots__ = ("src", "dst", "category")
+
+
+class Moved(SortEvent):
+    __slots__ = ("kind", "src", "dst", "moved")
+
+
+class MoveFailed(SortEvent):
+    __slots__ = ("kind", "src", "dst", "error")
+
+
+class Hashed(SortEvent):
+    __slots__ = ("path", "digest")
+
+
+class DuplicateFound(SortEvent):
+    __slots__ = ("digest", "original", "duplicates")
+
+
+class Progress(SortEvent):
+    __slots__ = ("event",)
+
+
+class PhaseTiming(SortEvent):
+    __slots__ = ("phase", "seconds")
+
+
+class Finished(SortEvent):
+    __slots__ = ("summary",)
+
+
+EVENT_TYPES = (Scanned, Skipped, Planned, Moved, MoveFailed, Hashed, DuplicateFound, Progress, PhaseTiming, Finished)
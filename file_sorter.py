@@ -1,116 +1,102 @@
 from pathlib import Path
-import shutil
-import hashlib
+import os
 import time
 import json
 import logging
 import re
-from typing import Optional, List, Callable, Dict, Tuple
+import queue
+import threading
+from collections import deque
+from typing import Optional, List, Callable, Dict, Iterable, Iterator, Set, Tuple
+
+from walker import walk_files
+from skip_rules import SkipRules
+from mover import DirectoryNames, MoveExecutor, ensure_dir, move_file, unique_target_path
+from hashing import DEFAULT_ALGORITHM, DEFAULT_HASH_WORKERS, compute_file_hash
+from duplicates import DuplicateFinder
+from hash_cache import HASH_CACHE_FILE, HASH_CACHE_FILES, HashCache
+from sorted_index import SORTED_INDEX_FILE, SORTED_INDEX_FILES, SortedIndex, stat_record
+from history import HISTORY_DIR, LEGACY_HISTORY_FILE, HistoryStore
+from replay import ReplayEngine
+from moved_items import MovedItems
+from plan import PlanEntry, SortPlan
+from progress import ProgressEvent, ProgressTracker
+from events import (EVENT_TYPES, DuplicateFound, Finished, Hashed, Moved, MoveFailed, PhaseTiming, Planned,
+                    Progress, Scanned, Skipped, SortEvent)
+from categories import DEFAULT_CATEGORIES, UNKNOWN_CATEGORY, CategoryRegistry, get_registry
 
 logger = logging.getLogger("smart_organizer")
 
-FILE_CATEGORIES: Dict[str, List[str]] = {
-    "Images": [".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tiff", ".webp", ".heic"],
-    "Documents": [".pdf", ".docx", ".doc", ".txt", ".odt", ".rtf"],
-    "Code": [".py", ".java", ".cpp", ".c", ".h", ".js", ".html", ".css", ".ts", ".go", ".rb"],
-    "Videos": [".mp4", ".mkv", ".avi", ".mov", ".wmv", ".flv"],
-    "Audio": [".mp3", ".wav", ".aac", ".ogg", ".flac"],
-    "Archives": [".zip", ".rar", ".tar", ".gz", ".7z"],
-    "Spreadsheets": [".xls", ".xlsx", ".csv"],
-    "Presentations": [".ppt", ".pptx"]
-}
-UNKNOWN_CATEGORY = "Others"
-HISTORY_FILE = ".sort_history.json"
+# Kept as module attributes for backwards compatibility; the live,
+# user-configurable table is categories.get_registry().
+FILE_CATEGORIES: Dict[str, List[str]] = DEFAULT_CATEGORIES
+HISTORY_FILE = LEGACY_HISTORY_FILE
+DUPLICATES_REPORT = "duplicates_report.json"
+BOOKKEEPING_FILES = (HISTORY_DIR, HISTORY_FILE, DUPLICATES_REPORT) + HASH_CACHE_FILES + SORTED_INDEX_FILES
+# Scan-ahead limit for pipeline mode (pending move jobs held in memory).
+PIPELINE_QUEUE_SIZE = 1024
 
 def find_category_for_suffix(suffix: str) -> str:
-    suffix = suffix.lower()
-    for cat, exts in FILE_CATEGORIES.items():
-        if suffix in exts:
-            return cat
-    return UNKNOWN_CATEGORY
-
-def ensure_dir(path: Path):
-    path.mkdir(parents=True, exist_ok=True)
-
-def unique_target_path(target: Path) -> Path:
-    if not target.exists():
-        return target
-    stem, suffix = target.stem, target.suffix
-    parent = target.parent
-    i = 1
-    while True:
-        candidate = parent / f"{stem} ({i}){suffix}"
-        if not candidate.exists():
-            return candidate
-        i += 1
-
-def compute_file_hash(path: Path, chunk_size=8*1024*1024) -> str:
-    h = hashlib.sha256()
-    try:
-        with path.open("rb") as f:
-            while chunk := f.read(chunk_size):
-                h.update(chunk)
-        return h.hexdigest()
-    except Exception as e:
-        logger.debug("Hash error %s: %s", path, e)
-        return ""
+    return get_registry().category_for_suffix(suffix)
 
-def move_file(src: Path, dst: Path, dry_run=False) -> Tuple[Path, bool]:
-    try:
-        if src.resolve() == dst.resolve():
-            # Already exactly where it needs to be (e.g. a duplicate
-            # re-scanned on a later run) -- nothing to do, and treating
-            # this as "needs a unique name" would just rename it to
-            # "(1)", "(2)"... on every subsequent run.
-            return dst, False
-    except Exception:
-        pass
-    final_dst = unique_target_path(dst)
-    if dry_run:
-        logger.debug("[DRY-RUN] %s -> %s", src, final_dst)
-        return final_dst, False
-    ensure_dir(final_dst.parent)
-    shutil.move(str(src), str(final_dst))
-    logger.info("Moved: %s -> %s", src, final_dst)
-    return final_dst, True
-
-def _should_skip(path: Path, root_dir: Path, dest_root: Path, include_hidden: bool, exclude_patterns: Optional[List[str]] = None) -> bool:
-    if not include_hidden and any(part.startswith(".") for part in path.parts):
-        return True
+def find_category_for_name(name: str) -> str:
+    return get_registry().category_for_name(name)
 
-    # Skip anything already sitting inside a category folder (including
-    # "Others" and "Duplicates") so re-running Sort on an already-sorted
-    # folder doesn't re-shuffle, duplicate-suffix ("(1)", "(2)"...), or
-    # nest those files deeper each time.
-    protected_dirs = list(FILE_CATEGORIES.keys()) + [UNKNOWN_CATEGORY, "Duplicates"]
+def _remove_empty_dirs(paths: Iterable[Path], stop_at: Optional[Path] = None) -> List[Path]:
+    """
+    Remove each of `paths` that is an empty directory, deepest first.
+    With `stop_at`, parents that become empty are removed too, up to
+    but not including `stop_at`.
 
-    for cat in protected_dirs:
-        try:
-            if path.is_relative_to(dest_root / cat):
-                return True
-        except Exception:
-            pass
+    Every directory is tried at most once with a bare rmdir(), which
+    fails cheaply on a non-empty one -- no listing, no rglob -- so the
+    cost is linear in the number of candidates.
+    """
+    stop = os.path.normcase(str(stop_at)) if stop_at is not None else None
+    by_depth: Dict[int, Set[str]] = {}
+    seen: Set[str] = set()
 
-    # Never treat the organizer's own bookkeeping files as sortable
-    # content.
-    if path.name in (HISTORY_FILE, "duplicates_report.json"):
-        return True
+    def add(d: str):
+        if d not in seen:
+            seen.add(d)
+            by_depth.setdefault(d.count(os.sep), set()).add(d)
 
-    if exclude_patterns:
-        for pat in exclude_patterns:
-            if path.match(pat):
-                return True
-    return False
+    for p in paths:
+        add(os.path.normpath(str(p)))
+    removed = []
+    while by_depth:
+        for d in sorted(by_depth.pop(max(by_depth))):
+            try:
+                os.rmdir(d)
+            except OSError:
+                continue
+            removed.append(Path(d))
+            parent = os.path.dirname(d)
+            parent_norm = os.path.normcase(parent)
+            if stop is not None and parent_norm != stop and parent_norm.startswith(stop + os.sep):
+                add(parent)
+    return removed
 
-def _remove_empty_dirs(paths: List[Path]) -> List[Path]:
+def _remove_empty_tree(root: Path) -> List[Path]:
+    """
+    Remove every empty directory under `root` (and `root` itself if it
+    ends up empty) in one bottom-up walk: each directory is listed once,
+    and a parent is empty when it has no files and all of its
+    subdirectories were removed.
+    """
     removed = []
-    for d in sorted(paths, key=lambda p: len(str(p)), reverse=True):
-        try:
-            if d.exists() and d.is_dir() and not any(d.rglob("*")):
-                d.rmdir()
-                removed.append(d)
-        except Exception as e:
-            logger.debug("Remove dir fail %s: %s", d, e)
+    kept: Dict[str, bool] = {}
+    for dirpath, dirnames, filenames in os.walk(root, topdown=False):
+        # Symlinked dirs aren't walked, so they're never in `kept`: keep.
+        busy = bool(filenames) or any(kept.pop(os.path.join(dirpath, d), True) for d in dirnames)
+        if not busy:
+            try:
+                os.rmdir(dirpath)
+                removed.append(Path(dirpath))
+            except OSError as e:
+                logger.debug("Remove dir fail %s: %s", dirpath, e)
+                busy = True
+        kept[dirpath] = busy
     return removed
 
 def pick_original(paths: List[Path]) -> Path:
@@ -124,7 +110,36 @@ def pick_original(paths: List[Path]) -> Path:
         return penalties, len(name)
     return sorted(paths, key=score)[0]
 
-def sort_directory(
+def _sort_target(p: Path, root_dir: Path, target_dir: Path, preserve_structure: bool) -> Path:
+    if preserve_structure:
+        try:
+            rel = p.relative_to(root_dir)
+            # תיקון image/image
+            if target_dir in p.parents:
+                return target_dir / p.name
+            return target_dir / rel
+        except Exception:
+            return target_dir / p.name
+    return target_dir / p.name
+
+def _sort_rules(root_dir: Path, dest_root: Path, categories: CategoryRegistry, include_hidden: bool,
+                exclude_patterns: Optional[List[str]]) -> SkipRules:
+    # Skip anything already sitting inside a category folder (including
+    # "Others" and "Duplicates") so re-running Sort on an already-sorted
+    # folder doesn't re-shuffle, duplicate-suffix ("(1)", "(2)"...), or
+    # nest those files deeper each time. Those folders are pruned from
+    # the walk entirely, together with hidden folders and `dir/`
+    # excludes. The organizer's own bookkeeping files are never
+    # treated as sortable content.
+    return SkipRules(
+        root_dir, dest_root,
+        protected_names=categories.names + ["Duplicates"],
+        include_hidden=include_hidden,
+        exclude_patterns=exclude_patterns,
+        bookkeeping_names=BOOKKEEPING_FILES,
+    )
+
+def iter_sort(
     root_dir: Path,
     dest_root: Optional[Path] = None,
     preserve_structure: bool = True,
@@ -135,261 +150,974 @@ def sort_directory(
     max_size_bytes: Optional[int] = None,
     compute_duplicates: bool = False,
     progress_callback: Optional[Callable[[int, int], None]] = None,
-    suffix_filter: Optional[List[str]] = None
-) -> dict:
+    suffix_filter: Optional[List[str]] = None,
+    categories: Optional[CategoryRegistry] = None,
+    workers: int = 1,
+    pipeline: bool = False,
+    use_hash_cache: bool = True,
+    hash_algorithm: str = DEFAULT_ALGORITHM,
+    hash_workers: Optional[int] = None,
+    incremental_duplicates: bool = False,
+    history_options: Optional[dict] = None,
+    remove_empty_dirs: bool = True,
+    on_progress: Optional[Callable[[ProgressEvent], None]] = None,
+    on_item: Optional[Callable[[str, str, str, bool], None]] = None,
+    keep_items: bool = True,
+    continue_on_error: bool = False,
+    events: Optional[Iterable[type]] = None
+) -> Iterator[SortEvent]:
+    """
+    sort_directory() as a generator of typed events (see events.py),
+    ending with Finished(summary). Arguments are sort_directory's;
+    `events` limits which event types are built and yielded (default:
+    all -- Finished always comes).
+
+    Events are yielded between pieces of work: per file while scanning
+    (per moved file too with `pipeline=True`), and after each phase
+    otherwise. Events raised on worker threads -- the pipeline scan,
+    Progress -- are queued and handed over at the next such point.
+
+    Closing the generator early stops the sort: moves already under
+    way finish, and everything moved so far is recorded for Undo. The
+    same happens when the sort fails with an exception.
+    """
     if dest_root is None:
         dest_root = root_dir
+    if categories is None:
+        categories = get_registry()
+    wanted = set(EVENT_TYPES if events is None else events)
+    want_scan = Scanned in wanted
+    want_skip = Skipped in wanted
+    want_plan = Planned in wanted
+    want_moved = Moved in wanted
+    want_failed = MoveFailed in wanted
+    want_timing = PhaseTiming in wanted
+    want_progress = Progress in wanted
+    # Events raised on other threads (pipeline scan, progress) wait
+    # here until the generator's next yield point.
+    pending: "deque[SortEvent]" = deque()
+
+    def drain():
+        while pending:
+            yield pending.popleft()
+
     root_dir, dest_root = root_dir.resolve(), dest_root.resolve()
     summary = {"root": str(root_dir), "dest_root": str(dest_root), "total_files": 0,
-               "moved_count": 0, "moved_items": [], "duplicate_count": 0,
-               "duration_seconds": 0.0, "created_dirs": []}
+               "moved_count": 0, "moved_items": MovedItems(), "duplicate_count": 0,
+               "duration_seconds": 0.0, "created_dirs": [], "errors": []}
     start_time = time.time()
-    files: List[Path] = []
 
     # --- איסוף קבצים ---
-    for p in root_dir.rglob("*"):
-        if p.is_dir() or _should_skip(p, root_dir, dest_root, include_hidden, exclude_patterns):
-            continue
-        if suffix_filter and p.suffix.lower() not in [s.lower() for s in suffix_filter]:
-            continue
+    rules = _sort_rules(root_dir, dest_root, categories, include_hidden, exclude_patterns)
+    suffixes = {s.lower() for s in suffix_filter} if suffix_filter else None
+
+    def report_progress(event: ProgressEvent):
+        if on_progress:
+            on_progress(event)
+        if want_progress:
+            pending.append(Progress(event))
+
+    tracker = ProgressTracker(report_progress) if on_progress or want_progress else None
+    # src -> size, so the mover's callback can count bytes.
+    sizes: Optional[Dict[str, int]] = {} if tracker else None
+
+    timings: Dict[str, float] = {}
+    counters: Dict[str, int] = {}
+
+    def phase_done(phase: str, seconds: float):
+        timings[phase] = seconds
+        if want_timing:
+            pending.append(PhaseTiming(phase, seconds))
+
+    def scan_jobs():
+        if rules.root_protected:
+            return
+        # Time spent inside this generator is split into walking +
+        # filtering ("scan") and picking the target ("categorize");
+        # time the consumer spends between items isn't counted.
+        clock = time.perf_counter
+        scan_time = categorize_time = 0.0
+        t = clock()
         try:
-            size = p.stat().st_size
-        except Exception:
-            continue
-        if min_size_bytes and size < min_size_bytes:
-            continue
-        if max_size_bytes and size > max_size_bytes:
-            continue
-        files.append(p)
-    summary["total_files"] = len(files)
+            for rec in walk_files(root_dir, rules.prune_dir, rules.skip_file, counters):
+                if want_scan:
+                    pending.append(Scanned(rec.path, rec.size))
+                if suffixes is not None and rec.suffix.lower() not in suffixes:
+                    if want_skip:
+                        pending.append(Skipped(rec.path, "suffix"))
+                    continue
+                if min_size_bytes and rec.size < min_size_bytes:
+                    if want_skip:
+                        pending.append(Skipped(rec.path, "min_size"))
+                    continue
+                if max_size_bytes and rec.size > max_size_bytes:
+                    if want_skip:
+                        pending.append(Skipped(rec.path, "max_size"))
+                    continue
+                t1 = clock()
+                scan_time += t1 - t
+                p = Path(rec.path)
+                if sizes is not None:
+                    sizes[rec.path] = rec.size
+                category = categories.category_for_name(p.name)
+                job = p, _sort_target(p, root_dir, dest_root / category, preserve_structure)
+                if want_plan:
+                    pending.append(Planned(rec.path, str(job[1]), category))
+                categorize_time += clock() - t1
+                yield job
+                t = clock()
+            scan_time += clock() - t
+        finally:
+            phase_done("scan", scan_time)
+            phase_done("categorize", categorize_time)
 
     # --- מיון לפי קטגוריות ---
     created_dirs_set = set()
-    processed = 0
-    for p in files:
-        category = find_category_for_suffix(p.suffix)
-        target_dir = dest_root / category
-        if preserve_structure:
-            try:
-                rel = p.relative_to(root_dir)
-                # תיקון image/image
-                if target_dir in p.parents:
-                    dst = target_dir / p.name
-                else:
-                    dst = target_dir / rel
-            except Exception:
-                dst = target_dir / p.name
-        else:
-            dst = target_dir / p.name
-        final_dst, moved = move_file(p, dst, dry_run)
-        created_dirs_set.add(str(final_dst.parent))
-        summary["moved_items"].append((str(p), str(final_dst), moved))
+    moved_from: Set[str] = set()
+    # Only incremental duplicate checks need this run's files again.
+    run_paths: Optional[List[str]] = [] if incremental_duplicates and not keep_items else None
+    history_writer = None
+    if not keep_items and not dry_run:
+        try:
+            history_writer = HistoryStore(dest_root, **(history_options or {})).begin(
+                {"timestamp": time.time(), "root": str(root_dir), "dest_root": str(dest_root)})
+        except Exception as e:
+            logger.debug("Failed to write history: %s", e)
+
+    def report(kind: str, src: str, dst: str, moved: bool):
+        # Counters, on_item and the Moved event: as soon as a move is done.
+        created_dirs_set.add(os.path.dirname(dst))
         if moved:
+            moved_from.add(os.path.dirname(src))
             summary["moved_count"] += 1
+            if kind == "duplicate":
+                summary["duplicate_count"] += 1
+        if on_item:
+            on_item(kind, src, dst, moved)
+        if want_moved:
+            pending.append(Moved(kind, src, dst, moved))
+
+    def store(kind: str, src: str, dst: str, moved: bool):
+        # moved_items and the history: always in job order.
+        nonlocal history_writer
+        if keep_items:
+            summary["moved_items"].append((src, dst, moved))
+        elif run_paths is not None and kind == "move":
+            run_paths.append(dst if moved else src)
+        if history_writer is not None:
+            try:
+                history_writer.add(src, dst, moved)
+            except Exception as e:
+                logger.debug("Failed to write history: %s", e)
+                history_writer.abort()
+                history_writer = None
+
+    def record(kind: str, src: str, dst: str, moved: bool):
+        report(kind, src, dst, moved)
+        store(kind, src, dst, moved)
+
+    def write_history():
+        history_header = {"timestamp": time.time(), "root": str(root_dir), "dest_root": str(dest_root),
+                          "created_dirs": sorted(created_dirs_set)}
+        try:
+            store = HistoryStore(dest_root, **(history_options or {}))
+            if history_writer is not None:
+                store.commit(history_writer)
+            elif keep_items:
+                store.append(history_header, summary["moved_items"])
+        except Exception as e:
+            logger.debug("Failed to write history: %s", e)
+
+    processed = 0
+    discovered = 0
+    callback_failed = False
+
+    def call_progress():
+        nonlocal callback_failed
+        try:
+            progress_callback(processed, discovered)
+        except Exception as e:
+            # Never abort the sort over it, but don't hide it either.
+            if not callback_failed:
+                callback_failed = True
+                logger.warning("progress_callback failed: %r", e)
+
+    def on_moved(src: Path, final_dst: Path, moved: bool):
+        nonlocal processed
         processed += 1
+        if tracker:
+            tracker.advance(1, sizes.pop(str(src), 0))
         if progress_callback:
+            call_progress()
+
+    def move_failed(kind: str) -> Optional[Callable[[Path, Path, Exception], None]]:
+        if not continue_on_error:
+            return None
+
+        def report(src: Path, dst: Path, error: Exception):
+            message = f"Error moving {src} -> {dst}: {error}"
+            logger.error(message)
+            summary["errors"].append(message)
+            if want_failed:
+                pending.append(MoveFailed(kind, str(src), str(dst), str(error)))
+        return report
+
+    executor = MoveExecutor(workers=workers, dry_run=dry_run, on_moved=on_moved, on_error=move_failed("move"))
+    # Finished moves waiting to be recorded, in order: ("move" |
+    # "duplicate", result -- None if it failed). Taken off the front as
+    # they are recorded, so stopping early (see below) records each one
+    # exactly once.
+    to_record: "deque[Tuple[str, Optional[Tuple[Path, Path, bool]]]]" = deque()
+    # Pipeline results already reported but not yet stored (an earlier
+    # job is still running), by job index.
+    held: Dict[int, Optional[Tuple[Path, Path, bool]]] = {}
+    next_stored = 0
+
+    def store_ready():
+        nonlocal next_stored
+        while next_stored in held:
+            result = held.pop(next_stored)
+            next_stored += 1
+            if result is not None:
+                store("move", str(result[0]), str(result[1]), result[2])
+
+    def store_rest():
+        # After an early stop, jobs that never ran leave gaps; what did
+        # run is stored in job order all the same.
+        for index in sorted(held):
+            result = held[index]
+            if result is not None:
+                store("move", str(result[0]), str(result[1]), result[2])
+        held.clear()
+
+    def record_pending():
+        while to_record:
+            kind, result = to_record.popleft()
+            if result is not None:
+                p, final_dst, moved = result
+                record(kind, str(p), str(final_dst), moved)
+            if pending:
+                yield from drain()
+
+    dup_executor: Optional[MoveExecutor] = None
+    try:
+        if pipeline:
+            # The scan runs on its own thread and feeds a bounded queue, so
+            # moving starts as soon as the first file is found and only
+            # PIPELINE_QUEUE_SIZE pending jobs are ever held in memory.
+            jobs_queue: "queue.Queue" = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+            scan_errors: List[BaseException] = []
+            stop_scan = threading.Event()
+            if tracker:
+                tracker.set_phase("moving")
+
+            def scanner():
+                nonlocal discovered
+                try:
+                    for job in scan_jobs():
+                        if stop_scan.is_set():
+                            break
+                        discovered += 1
+                        jobs_queue.put(job)
+                except BaseException as e:
+                    scan_errors.append(e)
+                finally:
+                    if tracker:
+                        # The total is known from here on (ETA becomes available).
+                        tracker.total = discovered
+                    jobs_queue.put(None)
+
+            def queued_jobs():
+                while True:
+                    job = jobs_queue.get()
+                    if job is None:
+                        return
+                    yield job
+
+            scan_thread = threading.Thread(target=scanner, daemon=True)
+            scan_thread.start()
+            stream = executor.run_stream(queued_jobs())
+            move_start = time.perf_counter()
             try:
-                progress_callback(processed, len(files))
-            except Exception:
-                pass
+                # Each move is reported as soon as it completes -- with
+                # several workers that is completion order -- and stored
+                # in job order: `held` only keeps results that finished
+                # ahead of an earlier, still running job.
+                for index, result in stream:
+                    held[index] = result
+                    if result is not None:
+                        report("move", str(result[0]), str(result[1]), result[2])
+                    store_ready()
+                    if pending:
+                        yield from drain()
+            finally:
+                stop_scan.set()
+                # Unblock the scanner if it is waiting on a full queue.
+                while scan_thread.is_alive():
+                    try:
+                        jobs_queue.get(timeout=0.05)
+                    except queue.Empty:
+                        pass
+                # That may have swallowed the scanner's end marker, which
+                # the stream's dispatcher needs if we stopped early.
+                jobs_queue.put(None)
+                stream.close()
+            # Overlaps the scan in this mode (includes waiting for jobs).
+            phase_done("move", time.perf_counter() - move_start)
+            if scan_errors:
+                raise scan_errors[0]
+            store_rest()
+            if progress_callback:
+                # The final total, now that the scan is over.
+                call_progress()
+        else:
+            if tracker:
+                tracker.set_phase("scanning")
+            jobs = []
+            for job in scan_jobs():
+                jobs.append(job)
+                if tracker:
+                    tracker.advance()
+                if pending:
+                    yield from drain()
+            if tracker:
+                tracker.set_phase("moving", total=len(jobs), bytes_total=sum(sizes.values()))
+            discovered = len(jobs)
+            move_start = time.perf_counter()
+            to_record.extend(("move", r) for r in executor.run(jobs))
+            del jobs
+            phase_done("move", time.perf_counter() - move_start)
+        summary["total_files"] = discovered
 
-    # --- חישוב כפילויות עם סינון suffix_filter ---
-    duplicates_summary = {}
-    if compute_duplicates:
-        hashes = {}
-        size_map = {}
-        for p in dest_root.rglob("*"):
-            if not p.is_file():
-                continue
-            if p.name in (HISTORY_FILE, "duplicates_report.json"):
-                continue
-            if not include_hidden and any(part.startswith(".") for part in p.parts):
-                continue
-            if suffix_filter and p.suffix.lower() not in [s.lower() for s in suffix_filter]:
-                continue
+        moved_bytes = tracker.bytes_done if tracker else 0
+        yield from record_pending()
+        yield from drain()
+
+        # --- חישוב כפילויות עם סינון suffix_filter ---
+        duplicates_summary = {}
+        if compute_duplicates:
+            if tracker:
+                tracker.set_phase("duplicates")
+            phase_start = time.perf_counter()
+            dup_rules = SkipRules(dest_root, dest_root, include_hidden=include_hidden,
+                                  bookkeeping_names=BOOKKEEPING_FILES)
+            cache = None
+            if use_hash_cache:
+                try:
+                    cache = HashCache(dest_root / HASH_CACHE_FILE)
+                except Exception as e:
+                    logger.debug("Hash cache unavailable: %s", e)
+            index = None
             try:
-                size = p.stat().st_size
-            except Exception:
-                continue
-            size_map.setdefault(size, []).append(p)
-
-        for group in size_map.values():
-            if len(group) > 1:
-                for p in group:
-                    h = compute_file_hash(p)
-                    if h:
-                        hashes.setdefault(h, []).append(p)
-
-        for h, paths in hashes.items():
-            if len(paths) > 1:
-                original = pick_original(paths)
-                duplicates = [p for p in paths if p != original]
-                duplicates_summary[h] = {
-                    "original": str(original),
-                    "duplicates": [str(p) for p in duplicates]
-                }
-                category = find_category_for_suffix(original.suffix)
-                duplicates_dir = dest_root / "Duplicates" / category
-                for dup in duplicates:
-                    if preserve_structure:
-                        try:
-                            rel = dup.relative_to(dest_root)
-                            # --- תיקון כפילות קטגוריה ---
-                            parts = rel.parts
-                            if parts and parts[0].lower() == category.lower():
-                                rel = Path(*parts[1:])
-                                dst = duplicates_dir / rel
-                            else:
-                                # dup is not (yet) inside its category
-                                # folder -- fall back to a flat move
-                                # into Duplicates/<category>/<name>.
-                                # NOTE: previously `dst` was left
-                                # unset here, silently reusing a
-                                # stale path from an earlier loop
-                                # iteration and moving files to the
-                                # wrong destination.
+                index = SortedIndex(dest_root / SORTED_INDEX_FILE, include_hidden)
+            except Exception as e:
+                logger.debug("Sorted index unavailable: %s", e)
+            on_hashed = (lambda path, digest: pending.append(Hashed(path, digest))) if Hashed in wanted else None
+            finder = DuplicateFinder(
+                cache=cache,
+                algorithm=hash_algorithm,
+                workers=DEFAULT_HASH_WORKERS if hash_workers is None else hash_workers,
+                on_hashed=on_hashed,
+            )
+            incremental = incremental_duplicates and index is not None and not index.needs_rebuild
+            try:
+                if incremental:
+                    # Only this run's files, checked against same-size
+                    # files already in the index.
+                    new_recs = []
+                    if run_paths is None:
+                        run_paths = [dst if moved else src for src, dst, moved in summary["moved_items"]]
+                    for path in run_paths:
+                        rec = stat_record(Path(path))
+                        if rec is not None and (suffixes is None or rec.suffix.lower() in suffixes):
+                            new_recs.append(rec)
+                    index.add(new_recs)
+                    candidates = new_recs + [
+                        rec for rec in index.peers({r.size for r in new_recs}, exclude={r.path for r in new_recs})
+                        if suffixes is None or rec.suffix.lower() in suffixes
+                    ]
+                else:
+                    scanned = list(walk_files(dest_root, dup_rules.prune_dir, dup_rules.skip_file, counters))
+                    if index is not None:
+                        index.rebuild(scanned)
+                    candidates = [rec for rec in scanned if suffixes is None or rec.suffix.lower() in suffixes]
+                hash_start = time.perf_counter()
+                phase_done("duplicate_scan", hash_start - phase_start)
+                hashes = finder.find(candidates)
+                phase_done("hash", time.perf_counter() - hash_start)
+            finally:
+                if cache is not None:
+                    cache.close()
+                    summary["hash_cache"] = cache.stats
+            summary["duplicate_stats"] = finder.stats
+            summary["duplicate_stats"]["mode"] = "incremental" if incremental else "full"
+            yield from drain()
+
+            dup_jobs: List[Tuple[Path, Path]] = []
+            for h, paths in hashes.items():
+                if len(paths) > 1:
+                    original = pick_original(paths)
+                    duplicates = [p for p in paths if p != original]
+                    duplicates_summary[h] = {
+                        "original": str(original),
+                        "duplicates": [str(p) for p in duplicates]
+                    }
+                    if DuplicateFound in wanted:
+                        yield DuplicateFound(h, str(original), [str(p) for p in duplicates])
+                    category = categories.category_for_name(original.name)
+                    duplicates_dir = dest_root / "Duplicates" / category
+                    for dup in duplicates:
+                        if preserve_structure:
+                            try:
+                                rel = dup.relative_to(dest_root)
+                                # --- תיקון כפילות קטגוריה ---
+                                parts = rel.parts
+                                if parts and parts[0].lower() == category.lower():
+                                    rel = Path(*parts[1:])
+                                    dst = duplicates_dir / rel
+                                else:
+                                    # dup is not (yet) inside its category
+                                    # folder -- fall back to a flat move
+                                    # into Duplicates/<category>/<name>.
+                                    # NOTE: previously `dst` was left
+                                    # unset here, silently reusing a
+                                    # stale path from an earlier loop
+                                    # iteration and moving files to the
+                                    # wrong destination.
+                                    dst = duplicates_dir / dup.name
+                            except Exception:
                                 dst = duplicates_dir / dup.name
-                        except Exception:
+                        else:
                             dst = duplicates_dir / dup.name
-                    else:
-                        dst = duplicates_dir / dup.name
-
-                    final_dst, moved = move_file(dup, dst, dry_run)
-                    created_dirs_set.add(str(final_dst.parent))
-                    summary["moved_items"].append((str(dup), str(final_dst), moved))
-                    if moved:
-                        summary["moved_count"] += 1
-                        summary["duplicate_count"] += 1
-
-        if duplicates_summary:
-            report_path = dest_root / "duplicates_report.json"
-            try:
-                with report_path.open("w", encoding="utf-8") as f:
-                    json.dump(duplicates_summary, f, ensure_ascii=False, indent=2)
-            except Exception as e:
-                logger.error(f"Failed to save duplicates report: {e}")
+
+                        dup_jobs.append((dup, dst))
+
+            phase_start = time.perf_counter()
+            dup_executor = MoveExecutor(workers=workers, dry_run=dry_run, transfer=executor.transfer,
+                                        on_error=move_failed("duplicate"))
+            dup_results = dup_executor.run(dup_jobs)
+            if index is not None:
+                index.rename([(str(r[0]), str(r[1])) for r in dup_results if r is not None and r[2]])
+                # A dry run must leave the index describing the real tree.
+                index.close(commit=not dry_run)
+                summary["duplicate_stats"].update(index.stats)
+            to_record.extend(("duplicate", r) for r in dup_results)
+            del dup_results
+            yield from record_pending()
+            phase_done("duplicate_move", time.perf_counter() - phase_start)
+
+            phase_start = time.perf_counter()
+            if duplicates_summary:
+                report_path = dest_root / DUPLICATES_REPORT
+                try:
+                    with report_path.open("w", encoding="utf-8") as f:
+                        # The algorithm is recorded so digests from runs
+                        # with different algorithms are never compared.
+                        json.dump({"algorithm": hash_algorithm, "groups": duplicates_summary},
+                                  f, ensure_ascii=False, indent=2)
+                except Exception as e:
+                    logger.error(f"Failed to save duplicates report: {e}")
+            phase_done("report", time.perf_counter() - phase_start)
+            yield from drain()
+    except BaseException:
+        # The consumer stopped early, or the run failed. Whatever has been
+        # moved -- including moves that were still under way -- is
+        # recorded so Undo covers it.
+        for index, result in executor.unreported:
+            held[index] = result
+            if result is not None:
+                report("move", str(result[0]), str(result[1]), result[2])
+        store_rest()
+        if dup_executor is not None:
+            to_record.extend(("duplicate", result) for _, result in dup_executor.unreported)
+        while to_record:
+            kind, result = to_record.popleft()
+            if result is not None:
+                p, final_dst, moved = result
+                record(kind, str(p), str(final_dst), moved)
+        if not dry_run and summary["moved_count"]:
+            write_history()
+        elif history_writer is not None:
+            history_writer.abort()
+        raise
+    finally:
+        # Its cached directory descriptors, whatever ended the run.
+        executor.transfer.close()
+
+    # --- ניקוי תיקיות ריקות ---
+    summary["removed_dirs"] = []
+    if remove_empty_dirs and not dry_run:
+        if tracker:
+            tracker.set_phase("cleanup")
+        phase_start = time.perf_counter()
+        for stop_at in dict.fromkeys((root_dir, dest_root)):
+            candidates = [d for d in moved_from if d.startswith(str(stop_at) + os.sep)]
+            removed = _remove_empty_dirs(candidates, stop_at)
+            moved_from.difference_update(str(p) for p in removed)
+            summary["removed_dirs"].extend(str(p) for p in removed)
+        phase_done("cleanup", time.perf_counter() - phase_start)
+
+    # Renames vs. cross-device copies, and copy throughput.
+    summary["transfer"] = executor.transfer.summary()
 
     # --- היסטוריה ---
-    summary["created_dirs"] = sorted(list(created_dirs_set))
+    summary["created_dirs"] = sorted(created_dirs_set)
     summary["duration_seconds"] = time.time() - start_time
+    transfer_stats = summary["transfer"]
+    counters.update(
+        renames=transfer_stats["renamed"],
+        copies=transfer_stats["copied"],
+        bytes_copied=transfer_stats["bytes_copied"],
+    )
+    if compute_duplicates:
+        dup_stats = summary["duplicate_stats"]
+        counters.update(
+            files_hashed=dup_stats["sample_hashed"] + dup_stats["full_hashed"],
+            bytes_hashed=dup_stats["bytes_hashed"],
+            hash_cache_hits=summary.get("hash_cache", {}).get("hits", 0),
+        )
+    summary["timings"] = timings
+    summary["counters"] = counters
+    # One line per run, whatever the per-file log mode drops.
+    logger.info("Sorted %s: %d files, %d moved in %.2fs", root_dir, summary["total_files"],
+                summary["moved_count"], summary["duration_seconds"])
 
-    history_entry = {"timestamp": time.time(), "root": str(root_dir), "dest_root": str(dest_root),
-                     "items": [{"src": s, "dst": d, "moved": m} for s, d, m in summary["moved_items"]],
-                     "created_dirs": summary["created_dirs"]}
-    try:
-        hist_path = dest_root / HISTORY_FILE
-        existing = {"pointer": -1, "entries": []}
-        if hist_path.exists():
-            try:
-                with hist_path.open("r", encoding="utf-8") as fh:
-                    existing = json.load(fh)
-            except Exception:
-                existing = {"pointer": -1, "entries": []}
-        pointer = existing.get("pointer", -1)
-        entries = existing.get("entries", [])
-        entries = entries[:pointer + 1] if pointer + 1 <= len(entries) else entries
-        entries.append(history_entry)
-        pointer = len(entries) - 1
-        new_hist = {"pointer": pointer, "entries": entries}
-        if not dry_run:
-            with hist_path.open("w", encoding="utf-8") as fh:
-                json.dump(new_hist, fh, ensure_ascii=False, indent=2)
-    except Exception as e:
-        logger.debug("Failed to write history: %s", e)
+    if not dry_run:
+        phase_start = time.perf_counter()
+        write_history()
+        phase_done("history", time.perf_counter() - phase_start)
+    phase_done("total", time.time() - start_time)
+
+    if tracker:
+        tracker.finish(summary["total_files"], moved_bytes)
+    yield from drain()
+    yield Finished(summary)
+
+def sort_directory(
+    root_dir: Path,
+    dest_root: Optional[Path] = None,
+    preserve_structure: bool = True,
+    dry_run: bool = False,
+    include_hidden: bool = False,
+    exclude_patterns: Optional[List[str]] = None,
+    min_size_bytes: int = 0,
+    max_size_bytes: Optional[int] = None,
+    compute_duplicates: bool = False,
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+    suffix_filter: Optional[List[str]] = None,
+    categories: Optional[CategoryRegistry] = None,
+    workers: int = 1,
+    pipeline: bool = False,
+    use_hash_cache: bool = True,
+    hash_algorithm: str = DEFAULT_ALGORITHM,
+    hash_workers: Optional[int] = None,
+    incremental_duplicates: bool = False,
+    history_options: Optional[dict] = None,
+    remove_empty_dirs: bool = True,
+    on_progress: Optional[Callable[[ProgressEvent], None]] = None,
+    on_item: Optional[Callable[[str, str, str, bool], None]] = None,
+    keep_items: bool = True,
+    continue_on_error: bool = False
+) -> dict:
+    """
+    Sort every file under `root_dir` into category folders under
+    `dest_root` (default: `root_dir` itself).
+
+    By default the whole tree is scanned before the first move and
+    `progress_callback(processed, total)` is called after each file.
+    With `pipeline=True` scanning and moving overlap: the scan feeds a
+    bounded queue consumed by the mover, and `total` is the number of
+    files discovered so far until the scan ends (a last call reports
+    the final count). Use `on_progress` to tell the two apart: its
+    ProgressEvent.total is None while the scan is still running.
+
+    `on_progress` is the cheaper, richer alternative: it receives a
+    ProgressEvent (phase, counts, files/sec, bytes/sec, ETA) at most
+    every PROGRESS_INTERVAL seconds, plus on each phase change.
 
+    With `compute_duplicates`, files are hashed with `hash_algorithm`
+    on `hash_workers` threads (default DEFAULT_HASH_WORKERS), and
+    digests are cached in dest_root's HASH_CACHE_FILE unless
+    `use_hash_cache=False`. With `incremental_duplicates`, only this
+    run's files are checked, against the persistent SORTED_INDEX_FILE
+    size index instead of a rescan of dest_root.
+
+    `history_options` are passed to HistoryStore (compression,
+    keep_last, keep_days) when the run is recorded for Undo.
+
+    With `remove_empty_dirs`, source folders left empty by the moves
+    are removed afterwards (never `root_dir`/`dest_root` themselves).
+
+    `summary["moved_items"]` is a MovedItems container: iterating,
+    indexing or slicing it gives `(src, dst, moved)` tuples.
+
+    `on_item(kind, src, dst, moved)` is called for every recorded item,
+    kind "move" or "duplicate"; with `pipeline=True` as soon as each
+    move completes (in completion order when `workers > 1`).
+    `summary["moved_items"]` and the history entry are always in job
+    order. With `keep_items=False`, `summary["moved_items"]` stays
+    empty and items are streamed into the history as they finish;
+    together with `pipeline=True` memory no longer grows with the number
+    of files, only with the number of folders moved from and into.
+
+    By default the first file that fails to move aborts the run; every
+    move that completed -- including those running alongside it with
+    `workers > 1` -- is still recorded for Undo. With
+    `continue_on_error=True` the file is skipped instead, and the error
+    is logged and listed in `summary["errors"]`.
+
+    `summary["timings"]` holds wall seconds per phase (scan,
+    categorize, move, duplicate_scan, hash, duplicate_move, report,
+    cleanup, history, total) for the phases that ran, and
+    `summary["counters"]` the work behind them (dirs_listed,
+    stat_calls, renames, copies, bytes_copied and, with duplicates,
+    files_hashed, bytes_hashed, hash_cache_hits).
+
+    This is iter_sort() run to the end, keeping only its summary; use
+    iter_sort() directly to consume files, moves, duplicates and
+    timings as they happen.
+    """
+    summary = None
+    for event in iter_sort(
+        root_dir=root_dir,
+        dest_root=dest_root,
+        preserve_structure=preserve_structure,
+        dry_run=dry_run,
+        include_hidden=include_hidden,
+        exclude_patterns=exclude_patterns,
+        min_size_bytes=min_size_bytes,
+        max_size_bytes=max_size_bytes,
+        compute_duplicates=compute_duplicates,
+        progress_callback=progress_callback,
+        suffix_filter=suffix_filter,
+        categories=categories,
+        workers=workers,
+        pipeline=pipeline,
+        use_hash_cache=use_hash_cache,
+        hash_algorithm=hash_algorithm,
+        hash_workers=hash_workers,
+        incremental_duplicates=incremental_duplicates,
+        history_options=history_options,
+        remove_empty_dirs=remove_empty_dirs,
+        on_progress=on_progress,
+        on_item=on_item,
+        keep_items=keep_items,
+        continue_on_error=continue_on_error,
+        events=(),
+    ):
+        summary = event.summary
     return summary
 
-# --- Undo / Redo ---
-def undo(dest_root: Path) -> dict:
-    hist_path = dest_root / HISTORY_FILE
-    result = {"undone": 0, "errors": [], "removed_dirs": [], "redo_available": False}
-    if not hist_path.exists():
-        result["errors"].append("No history file found.")
-        return result
+# --- Plan / execute ---
+def plan_sort(
+    root_dir: Path,
+    dest_root: Optional[Path] = None,
+    preserve_structure: bool = True,
+    include_hidden: bool = False,
+    exclude_patterns: Optional[List[str]] = None,
+    min_size_bytes: int = 0,
+    max_size_bytes: Optional[int] = None,
+    suffix_filter: Optional[List[str]] = None,
+    categories: Optional[CategoryRegistry] = None
+) -> SortPlan:
+    """
+    Decide where every file under `root_dir` would go, without moving
+    anything: same rules and filters as sort_directory, but the result
+    is a SortPlan to save, review, diff or pass to execute_plan().
+
+    Files are planned in source-path order and collision names
+    ("(1)", "(2)"...) are picked against each destination folder's
+    current listing, so the same tree always yields the same plan.
+    """
+    if dest_root is None:
+        dest_root = root_dir
+    if categories is None:
+        categories = get_registry()
+    root_dir, dest_root = root_dir.resolve(), dest_root.resolve()
+    rules = _sort_rules(root_dir, dest_root, categories, include_hidden, exclude_patterns)
+    suffixes = {s.lower() for s in suffix_filter} if suffix_filter else None
+
+    records = []
+    if not rules.root_protected:
+        for rec in walk_files(root_dir, rules.prune_dir, rules.skip_file):
+            if suffixes is not None and rec.suffix.lower() not in suffixes:
+                continue
+            if min_size_bytes and rec.size < min_size_bytes:
+                continue
+            if max_size_bytes and rec.size > max_size_bytes:
+                continue
+            records.append(rec)
+    records.sort(key=lambda r: r.path)
+
+    names = DirectoryNames()
+    entries: List[PlanEntry] = []
+    for rec in records:
+        p = Path(rec.path)
+        category, matched = categories.match_name(p.name)
+        target = _sort_target(p, root_dir, dest_root / category, preserve_structure)
+        if str(target) == rec.path:
+            # Already where it belongs; a sort wouldn't touch it.
+            continue
+        if matched is not None:
+            reason = f"extension {matched}"
+        elif rec.suffix:
+            reason = f"no category rule for {rec.suffix.lower()}"
+        else:
+            reason = "no extension"
+        final_dst = names.reserve(target)
+        entries.append(PlanEntry(rec.path, str(final_dst), category, reason, final_dst != target,
+                                 rec.size, rec.mtime_ns))
+
+    options = {"preserve_structure": preserve_structure, "include_hidden": include_hidden,
+               "exclude_patterns": exclude_patterns or [], "min_size_bytes": min_size_bytes,
+               "max_size_bytes": max_size_bytes, "suffix_filter": sorted(suffixes) if suffixes else None}
+    return SortPlan(str(root_dir), str(dest_root), entries, options)
+
+def execute_plan(
+    plan: SortPlan,
+    workers: int = 1,
+    history_options: Optional[dict] = None,
+    remove_empty_dirs: bool = True,
+    on_progress: Optional[Callable[[ProgressEvent], None]] = None,
+    on_item: Optional[Callable[[str, str, str, bool], None]] = None,
+    dry_run: bool = False
+) -> dict:
+    """
+    Carry out a SortPlan without rescanning. Each source is stat()ed
+    once: entries whose file is gone or has changed size/mtime since
+    planning are skipped (`summary["skipped"]`, (src, reason) pairs).
+    A planned destination that has been taken in the meantime still
+    gets a fresh "(n)" name rather than being overwritten; those are
+    counted in `summary["diverged"]`.
+
+    The run is recorded for Undo like sort_directory, and the summary
+    has the same core keys. If a move fails the run stops there, and
+    what moved before it is still recorded. With `dry_run=True` nothing
+    is moved, removed or recorded; the summary shows the names the
+    moves would get now.
+    """
+    root_dir, dest_root = Path(plan.root), Path(plan.dest_root)
+    summary = {"root": plan.root, "dest_root": plan.dest_root, "total_files": len(plan),
+               "moved_count": 0, "moved_items": MovedItems(), "duplicate_count": 0,
+               "skipped": [], "diverged": 0, "duration_seconds": 0.0, "created_dirs": []}
+    start_time = time.time()
+
+    jobs: List[Tuple[Path, Path]] = []
+    sizes: Dict[str, int] = {}
+    for entry in plan:
+        try:
+            st = os.stat(entry.src)
+        except OSError:
+            summary["skipped"].append((entry.src, "missing"))
+            continue
+        if (entry.size is not None and st.st_size != entry.size) or \
+                (entry.mtime_ns is not None and st.st_mtime_ns != entry.mtime_ns):
+            summary["skipped"].append((entry.src, "changed"))
+            continue
+        sizes[entry.src] = st.st_size
+        jobs.append((Path(entry.src), Path(entry.dst)))
+
+    tracker = ProgressTracker(on_progress) if on_progress else None
+
+    def on_moved(src: Path, final_dst: Path, moved: bool):
+        if tracker:
+            tracker.advance(1, sizes.get(str(src), 0))
+
+    if tracker:
+        tracker.set_phase("moving", total=len(jobs), bytes_total=sum(sizes.values()))
+    executor = MoveExecutor(workers=workers, dry_run=dry_run, on_moved=on_moved)
+    error: Optional[BaseException] = None
     try:
-        with hist_path.open("r", encoding="utf-8") as fh:
-            state = json.load(fh)
-    except Exception as e:
-        result["errors"].append(f"Failed to read history: {e}")
-        return result
-    pointer = state.get("pointer", -1)
-    entries = state.get("entries", [])
-    if pointer < 0 or pointer >= len(entries):
-        result["errors"].append("No operation to undo.")
-        return result
-    last = entries[pointer]
-    for item in reversed(last.get("items", [])):
-        src, dst = Path(item["dst"]), Path(item["src"])
+        results = executor.run(jobs)
+    except BaseException as e:
+        # Record what moved before the failure, then re-raise.
+        error = e
+        results = [None] * len(jobs)
+        for index, result in executor.unreported:
+            results[index] = result
+    finally:
+        executor.transfer.close()
+
+    created_dirs_set = set()
+    moved_from: Set[str] = set()
+    for result, (_, planned) in zip(results, jobs):
+        if result is None:
+            continue
+        src, final_dst, moved = result
+        src_s, dst_s = str(src), str(final_dst)
+        created_dirs_set.add(os.path.dirname(dst_s))
+        summary["moved_items"].append((src_s, dst_s, moved))
+        if final_dst != planned:
+            summary["diverged"] += 1
+        if moved:
+            summary["moved_count"] += 1
+            moved_from.add(os.path.dirname(src_s))
+        if on_item:
+            on_item("move", src_s, dst_s, moved)
+
+    summary["removed_dirs"] = []
+    if remove_empty_dirs and not dry_run and error is None:
+        if tracker:
+            tracker.set_phase("cleanup")
+        for stop_at in dict.fromkeys((root_dir, dest_root)):
+            candidates = [d for d in moved_from if d.startswith(str(stop_at) + os.sep)]
+            removed = _remove_empty_dirs(candidates, stop_at)
+            moved_from.difference_update(str(p) for p in removed)
+            summary["removed_dirs"].extend(str(p) for p in removed)
+
+    summary["transfer"] = executor.transfer.summary()
+    summary["created_dirs"] = sorted(created_dirs_set)
+    summary["duration_seconds"] = time.time() - start_time
+    logger.info("Executed plan for %s: %d planned, %d moved, %d skipped in %.2fs", root_dir, len(plan),
+                summary["moved_count"], len(summary["skipped"]), summary["duration_seconds"])
+
+    if not dry_run and (error is None or summary["moved_count"]):
+        history_header = {"timestamp": time.time(), "root": plan.root, "dest_root": plan.dest_root,
+                          "created_dirs": summary["created_dirs"]}
         try:
-            if src.exists():
-                ensure_dir(dst.parent)
-                shutil.move(str(src), str(dst))
-                result["undone"] += 1
-            else:
-                result["errors"].append(f"Source not found for undo: {src}")
+            HistoryStore(dest_root, **(history_options or {})).append(history_header, summary["moved_items"])
         except Exception as e:
-            result["errors"].append(f"Error moving {src} -> {dst}: {e}")
-    created_dirs = [Path(p) for p in last.get("created_dirs", [])]
-    removed = _remove_empty_dirs(created_dirs)
+            logger.debug("Failed to write history: %s", e)
+    if error is not None:
+        raise error
+
+    if tracker:
+        tracker.finish(len(jobs), sum(sizes.values()))
+    return summary
+
+# --- Undo / Redo ---
+def _created_dirs(store: HistoryStore, entry_id: int, header: dict) -> List[Path]:
+    # Streamed entries (keep_items=False) don't list them in the header;
+    # they are exactly the items' destination folders.
+    if "created_dirs" in header:
+        return [Path(p) for p in header["created_dirs"]]
+    return [Path(p) for p in {os.path.dirname(dst) for _, dst, _ in store.iter_items(entry_id)}]
+
+def _undo_entry(dest_root: Path, engine: ReplayEngine, entry_id: int, result: dict):
+    last = engine.store.read_header(entry_id)
+    replayed = engine.run("undo", entry_id, entry_id - 1, engine.store.iter_items(entry_id))
+    result["undone"] += replayed["moved"]
+    result["errors"].extend(f"Source not found for undo: {p}" for p in replayed["missing"])
+    result["errors"].extend(replayed["errors"])
+    if replayed["interrupted"]:
+        # Stopped: the intent log stays and the next undo() resumes.
+        result["interrupted"] = True
+        return
+    created_dirs = _created_dirs(engine.store, entry_id, last)
+    removed = _remove_empty_dirs(created_dirs, dest_root)
     result["removed_dirs"].extend([str(p) for p in removed])
 
     # --- מחיקת תיקיות Duplicates ריקות ---
     duplicates_root = dest_root / "Duplicates"
     if duplicates_root.exists():
-        removed_dup = _remove_empty_dirs(list(duplicates_root.rglob("*")) + [duplicates_root])
+        removed_dup = _remove_empty_tree(duplicates_root)
         result["removed_dirs"].extend([str(p) for p in removed_dup])
 
-    state["pointer"] = pointer - 1
     try:
-        with hist_path.open("w", encoding="utf-8") as fh:
-            json.dump(state, fh, ensure_ascii=False, indent=2)
+        engine.finish(entry_id - 1)
     except Exception as e:
         result["errors"].append(f"Failed to update history: {e}")
-    result["redo_available"] = True
-    return result
 
-def redo(dest_root: Path) -> dict:
-    hist_path = dest_root / HISTORY_FILE
-    result = {"redone": 0, "errors": [], "created_dirs": []}
-    if not hist_path.exists():
-        result["errors"].append("No history file found.")
-        return result
-    try:
-        with hist_path.open("r", encoding="utf-8") as fh:
-            state = json.load(fh)
-    except Exception as e:
-        result["errors"].append(f"Failed to read history: {e}")
-        return result
-    pointer = state.get("pointer", -1)
-    entries = state.get("entries", [])
-    next_idx = pointer + 1
-    if next_idx < 0 or next_idx >= len(entries):
-        result["errors"].append("No operation to redo.")
-        return result
-    entry = entries[next_idx]
-    for item in entry.get("items", []):
-        src, dst = Path(item["src"]), Path(item["dst"])
-        try:
-            if src.exists():
-                ensure_dir(dst.parent)
-                shutil.move(str(src), str(dst))
-                result["redone"] += 1
-            else:
-                if not dst.exists():
-                    result["errors"].append(f"Redo source missing: {src}")
-        except Exception as e:
-            result["errors"].append(f"Error moving {src} -> {dst}: {e}")
-    created_dirs = [Path(p) for p in entry.get("created_dirs", [])]
+def _redo_entry(dest_root: Path, engine: ReplayEngine, entry_id: int, result: dict):
+    entry = engine.store.read_header(entry_id)
+    replayed = engine.run("redo", entry_id, entry_id, engine.store.iter_items(entry_id))
+    result["redone"] += replayed["moved"]
+    result["errors"].extend(f"Redo source missing: {p}" for p in replayed["missing"])
+    result["errors"].extend(replayed["errors"])
+    if replayed["interrupted"]:
+        result["interrupted"] = True
+        return
+    # Same source-folder cleanup as the original sort.
+    root = Path(entry.get("root", dest_root))
+    moved_from = {os.path.dirname(src) for src, _, _ in engine.store.iter_items(entry_id)}
+    for stop_at in dict.fromkeys((root, dest_root)):
+        _remove_empty_dirs([d for d in moved_from if d.startswith(str(stop_at) + os.sep)], stop_at)
+    created_dirs = _created_dirs(engine.store, entry_id, entry)
     for d in created_dirs:
         ensure_dir(d)
     duplicates_root = dest_root / "Duplicates"
     if duplicates_root.exists():
         ensure_dir(duplicates_root)
     result["created_dirs"] = [str(d) for d in created_dirs]
-    state["pointer"] = next_idx
     try:
-        with hist_path.open("w", encoding="utf-8") as fh:
-            json.dump(state, fh, ensure_ascii=False, indent=2)
+        engine.finish(entry_id)
     except Exception as e:
         result["errors"].append(f"Failed to update history: {e}")
+
+def _resume_other(dest_root: Path, engine: ReplayEngine, op: str, result: dict) -> Optional[dict]:
+    """
+    Finish an interrupted replay of the *other* kind before starting
+    `op`, so the history pointer matches the tree again. Returns the
+    intent if one of the same kind is pending (the caller resumes it).
+    """
+    pending = engine.pending()
+    if pending is None:
+        return None
+    result["resumed"] = True
+    if pending["op"] == op:
+        return pending
+    other = {"undone": 0, "redone": 0, "errors": result["errors"], "removed_dirs": [],
+             "created_dirs": [], "interrupted": False}
+    if pending["op"] == "undo":
+        _undo_entry(dest_root, engine, pending["entry"], other)
+    else:
+        _redo_entry(dest_root, engine, pending["entry"], other)
+    result["interrupted"] = other["interrupted"]
+    return None
+
+def undo(dest_root: Path, workers: int = 1, progress_callback: Optional[Callable[[int, int], None]] = None,
+         stop: Optional[threading.Event] = None) -> dict:
+    """
+    Revert the operation at the history pointer. Moves run on `workers`
+    threads and `progress_callback(done, total)` follows them. An undo
+    that was interrupted is resumed instead of starting a new one.
+
+    Setting `stop` interrupts it on purpose: moves under way finish,
+    the result has "interrupted": True and the next undo() resumes.
+    """
+    store = HistoryStore(dest_root)
+    result = {"undone": 0, "errors": [], "removed_dirs": [], "redo_available": False, "resumed": False,
+              "interrupted": False}
+    if not store.exists():
+        result["errors"].append("No history file found.")
+        return result
+    engine = ReplayEngine(store, workers, progress_callback, stop)
+    try:
+        pending = _resume_other(dest_root, engine, "undo", result)
+        if result["interrupted"]:
+            return result
+        state = store.state()
+        pointer = pending["entry"] if pending else state["pointer"]
+        # Entries below "base" were dropped by history retention.
+        if pointer < max(0, state["base"]):
+            result["errors"].append("No operation to undo.")
+            return result
+        _undo_entry(dest_root, engine, pointer, result)
+    except Exception as e:
+        result["errors"].append(f"Failed to read history: {e}")
+        return result
+    result["redo_available"] = not result["interrupted"]
+    return result
+
+def redo(dest_root: Path, workers: int = 1, progress_callback: Optional[Callable[[int, int], None]] = None,
+         stop: Optional[threading.Event] = None) -> dict:
+    """Re-apply the operation after the history pointer; see undo()."""
+    store = HistoryStore(dest_root)
+    result = {"redone": 0, "errors": [], "created_dirs": [], "resumed": False, "interrupted": False}
+    if not store.exists():
+        result["errors"].append("No history file found.")
+        return result
+    engine = ReplayEngine(store, workers, progress_callback, stop)
+    try:
+        pending = _resume_other(dest_root, engine, "redo", result)
+        if result["interrupted"]:
+            return result
+        state = store.state()
+        next_idx = pending["entry"] if pending else state["pointer"] + 1
+        if next_idx > state["head"]:
+            result["errors"].append("No operation to redo.")
+            return result
+        _redo_entry(dest_root, engine, next_idx, result)
+    except Exception as e:
+        result["errors"].append(f"Failed to read history: {e}")
     return result
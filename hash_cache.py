@@ -0,0 +1,162 @@
+"""
+Persistent content-hash cache for duplicate detection.
+
+Why this exists:
+Every `--duplicates` run used to re-hash every same-size file under
+dest_root from scratch, even though almost none of them change
+between runs. HashCache remembers digests in a small SQLite file
+next to the sort history (`.hash_cache.sqlite`), so a nightly pass
+only pays for new or modified files.
+
+Entries are keyed by (st_dev, st_ino) and are only trusted while
+size and mtime_ns still match -- the same check `make`/`rsync` rely
+on. Moving a file within a filesystem keeps its inode and mtime, so
+files the sorter itself just moved stay cached. A stale entry is
+dropped the first time it is looked up (invalidation), and close()
+prunes entries that haven't been seen for MAX_AGE_DAYS (vacuuming).
+
+`kind` separates different digests of the same file (full hash vs.
+sample hash, and the hash algorithm), so they can never be mixed up.
+"""
+
+import os
+import time
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from typing import Optional, Tuple
+
+logger = logging.getLogger("smart_organizer")
+
+HASH_CACHE_FILE = ".hash_cache.sqlite"
+# Files SQLite may create next to the cache while it is open.
+HASH_CACHE_FILES = (HASH_CACHE_FILE, HASH_CACHE_FILE + "-journal")
+
+MAX_AGE_DAYS = 30
+_SCHEMA_VERSION = 1
+
+CacheKey = Tuple[int, int, int, int]
+
+
+class HashCache:
+
+    def __init__(self, path: Path, max_age_days: float = MAX_AGE_DAYS):
+        self.path = Path(path)
+        self.max_age_days = max_age_days
+        self.stats = {"hits": 0, "misses": 0, "stored": 0, "invalidated": 0, "pruned": 0}
+        # Hashing may run on several threads; one connection, one lock.
+        self._lock = threading.Lock()
+        self._seen = []
+        self._pending = 0
+        self._db = self._open()
+
+    def _open(self) -> sqlite3.Connection:
+        try:
+            return self._connect()
+        except sqlite3.DatabaseError as e:
+            # It's only a cache -- start over rather than fail the run.
+            logger.warning("Hash cache unreadable (%s), recreating %s", e, self.path)
+            try:
+                self.path.unlink()
+            except OSError:
+                pass
+            return self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(str(self.path), check_same_thread=False)
+        version = db.execute("PRAGMA user_version").fetchone()[0]
+        if version != _SCHEMA_VERSION:
+            db.execute("DROP TABLE IF EXISTS hashes")
+            db.execute(
+                "CREATE TABLE hashes ("
+                " dev INTEGER NOT NULL, inode INTEGER NOT NULL, kind TEXT NOT NULL,"
+                " size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL,"
+                " digest TEXT NOT NULL, last_seen REAL NOT NULL,"
+                " PRIMARY KEY (dev, inode, kind)) WITHOUT ROWID"
+            )
+            db.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+            db.commit()
+        return db
+
+    # ----------------------------------------------------
+    # LOOKUP / STORE
+    # ----------------------------------------------------
+
+    @staticmethod
+    def key_for(path: Path) -> Optional[CacheKey]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns
+
+    def get(self, key: CacheKey, kind: str) -> Optional[str]:
+        dev, inode, size, mtime_ns = key
+        with self._lock:
+            row = self._db.execute(
+                "SELECT size, mtime_ns, digest FROM hashes WHERE dev=? AND inode=? AND kind=?",
+                (dev, inode, kind),
+            ).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            if row[0] != size or row[1] != mtime_ns:
+                self._db.execute(
+                    "DELETE FROM hashes WHERE dev=? AND inode=? AND kind=?", (dev, inode, kind)
+                )
+                self.stats["invalidated"] += 1
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits"] += 1
+            self._seen.append((dev, inode, kind))
+            return row[2]
+
+    def put(self, key: CacheKey, kind: str, digest: str):
+        dev, inode, size, mtime_ns = key
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (dev, inode, kind, size, mtime_ns, digest, time.time()),
+            )
+            self.stats["stored"] += 1
+            self._pending += 1
+            if self._pending >= 1000:
+                self._db.commit()
+                self._pending = 0
+
+    # ----------------------------------------------------
+    # MAINTENANCE
+    # ----------------------------------------------------
+
+    def vacuum(self, compact: bool = False) -> int:
+        """Drop entries not seen for max_age_days; optionally shrink the file."""
+        cutoff = time.time() - self.max_age_days * 86400
+        with self._lock:
+            cur = self._db.execute("DELETE FROM hashes WHERE last_seen < ?", (cutoff,))
+            pruned = cur.rowcount if cur.rowcount > 0 else 0
+            self._db.commit()
+            if compact:
+                self._db.execute("VACUUM")
+            self.stats["pruned"] += pruned
+        return pruned
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM hashes")
+            self._db.commit()
+            self._db.execute("VACUUM")
+
+    def close(self):
+        with self._lock:
+            if self._seen:
+                now = time.time()
+                self._db.executemany(
+                    "UPDATE hashes SET last_seen=? WHERE dev=? AND inode=? AND kind=?",
+                    [(now, dev, inode, kind) for dev, inode, kind in self._seen],
+                )
+                self._seen = []
+            self._db.commit()
+        self.vacuum()
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,440 @@
+"""
+Sort history storage (what Undo/Redo replays).
+
+Why this exists:
+History used to be one `.sort_history.json` holding every entry with
+every moved item. Each sort loaded the whole file, appended one entry
+and rewrote it with `indent=2`, and Undo/Redo rewrote it again just to
+change `pointer` -- after a few months that is hundreds of MB parsed
+and re-serialized on every click.
+
+HistoryStore keeps a journal directory instead:
+
+    .sort_history/
+        state.json          {"pointer": 7, "head": 9, "base": 0}
+        000000007.jsonl     one segment per sort operation
+        ...
+
+  - a segment is a header line (timestamp, root, dest_root,
+    created_dirs) followed by one `[src, dst, moved]` line per item,
+    written once and never rewritten; begin()/commit() let a sort
+    stream items into it as they run instead of collecting them first
+  - state.json is a few bytes, replaced atomically (write + rename)
+
+So appending an entry costs only that entry, and Undo/Redo moving the
+pointer is O(1). A segment is written before state.json points at it,
+so a crash mid-write leaves the previous history intact.
+
+An existing `.sort_history.json` is migrated into the journal the
+first time the store is opened, then removed.
+
+Size on disk:
+Storing full absolute `src`/`dst` strings for every item, forever,
+made history grow without bound. By default segments now use a
+compact encoding: each directory is defined once, relative to its
+already-known parent (`["D", id, parent_id, name]`), and items are
+`[src_dir, src_name, dst_dir, dst_name_or_null, moved]` -- with null
+meaning "same name as the source", the common case. On top of that a
+segment can be gzip- or zstd-compressed (`.jsonl.gz` / `.jsonl.zst`,
+zstd needs the optional `zstandard` package). Reading detects all of
+this per segment, so old and new segments mix freely.
+
+Retention (`keep_last` operations and/or `keep_days`) is applied on
+every append; `compact()` rewrites existing segments in the current
+encoding/compression and applies retention too.
+"""
+
+import io
+import os
+import gzip
+import json
+import time
+import logging
+import itertools
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+try:
+    import zstandard
+except Exception:
+    zstandard = None
+
+logger = logging.getLogger("smart_organizer")
+
+HISTORY_DIR = ".sort_history"
+LEGACY_HISTORY_FILE = ".sort_history.json"
+STATE_FILE = "state.json"
+SEGMENT_SUFFIX = ".jsonl"
+
+COMPRESSION_SUFFIXES = {None: "", "gzip": ".gz", "zstd": ".zst"}
+HISTORY_COMPRESSIONS = ("gzip", "zstd")
+COMPACT_FORMAT = 2
+
+Item = Tuple[str, str, bool]
+
+
+class HistoryError(Exception):
+    pass
+
+
+def _open_segment(path: Path, mode: str):
+    """Open a segment for text I/O, (de)compressing by file suffix."""
+    if path.suffix == ".gz":
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    if path.suffix == ".zst":
+        if zstandard is None:
+            raise HistoryError("zstd-compressed history needs the 'zstandard' package")
+        if mode == "r":
+            stream = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+        else:
+            stream = zstandard.ZstdCompressor().stream_writer(open(path, "wb"), closefd=True)
+        return io.TextIOWrapper(stream, encoding="utf-8")
+    return path.open(mode, encoding="utf-8")
+
+
+class _DirInterner:
+
+    def __init__(self, emit):
+        self._ids: Dict[str, int] = {}
+        self._emit = emit
+
+    def intern(self, directory: str) -> int:
+        known = self._ids.get(directory)
+        if known is not None:
+            return known
+        # Walk up to the nearest already-defined ancestor, then define
+        # the missing levels top-down, each relative to its parent.
+        chain = []
+        current = directory
+        while current not in self._ids:
+            parent = os.path.dirname(current)
+            chain.append(current)
+            if parent == current:
+                break
+            current = parent
+        for d in reversed(chain):
+            parent = os.path.dirname(d)
+            new_id = len(self._ids)
+            if parent != d and parent in self._ids:
+                self._emit(["D", new_id, self._ids[parent], os.path.basename(d)])
+            else:
+                self._emit(["D", new_id, -1, d])
+            self._ids[d] = new_id
+        return self._ids[directory]
+
+
+_tmp_ids = itertools.count()
+
+
+class SegmentWriter:
+    """
+    Writes one segment item by item, to a temp file in the history
+    directory; HistoryStore.commit() turns it into the next entry.
+    Nothing is recorded until then -- an abandoned writer removes its
+    temp file.
+    """
+
+    def __init__(self, directory: Path, header: dict, compact: bool, compression: Optional[str]):
+        header = {k: v for k, v in header.items() if k not in ("items", "format")}
+        if compact:
+            header["format"] = COMPACT_FORMAT
+        suffix = SEGMENT_SUFFIX + COMPRESSION_SUFFIXES[compression]
+        # Keep the real suffix on the temp file so _open_segment compresses it.
+        self.tmp = directory / f".tmp-{os.getpid()}-{next(_tmp_ids)}{suffix}"
+        self.suffix = suffix
+        self.count = 0
+        self._fh = _open_segment(self.tmp, "w")
+        self._dirs = _DirInterner(self._emit) if compact else None
+        self._emit(header)
+
+    def _emit(self, record):
+        self._fh.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    def add(self, src: str, dst: str, moved: bool):
+        if self._dirs is None:
+            self._emit([src, dst, moved])
+            self.count += 1
+            return
+        src_dir, src_name = os.path.split(src)
+        dst_dir, dst_name = os.path.split(dst)
+        self.add_parts(src_dir, src_name, dst_dir, None if dst_name == src_name else dst_name, moved)
+
+    def add_parts(self, src_dir: str, src_name: str, dst_dir: str, dst_name: Optional[str], moved: bool):
+        """add() for an item already split into folders and names (dst_name None: same name)."""
+        if self._dirs is None:
+            dst = os.path.join(dst_dir, src_name if dst_name is None else dst_name)
+            self._emit([os.path.join(src_dir, src_name), dst, moved])
+        else:
+            self._emit([self._dirs.intern(src_dir), src_name, self._dirs.intern(dst_dir), dst_name,
+                        1 if moved else 0])
+        self.count += 1
+
+    def close(self):
+        """Finish the file and make sure its bytes are on disk."""
+        if self._fh is None:
+            return
+        self._fh.flush()
+        self._fh.close()
+        self._fh = None
+        # The (possibly compressed) bytes must hit the disk before
+        # state.json can point at this segment.
+        with open(self.tmp, "rb") as raw:
+            os.fsync(raw.fileno())
+
+    def abort(self):
+        if self._fh is not None:
+            try:
+                self._fh.close()
+            except Exception:
+                pass
+            self._fh = None
+        try:
+            os.unlink(self.tmp)
+        except OSError:
+            pass
+
+    def __del__(self):
+        # Still open here means nobody committed it (e.g. the sort
+        # raised halfway): drop the partial file.
+        if getattr(self, "_fh", None) is not None:
+            self.abort()
+
+
+class HistoryStore:
+
+    def __init__(
+        self,
+        dest_root: Path,
+        compact: bool = True,
+        compression: Optional[str] = None,
+        keep_last: Optional[int] = None,
+        keep_days: Optional[float] = None,
+    ):
+        if compression not in COMPRESSION_SUFFIXES:
+            raise ValueError(f"Unsupported history compression: {compression}")
+        if compression == "zstd" and zstandard is None:
+            raise ValueError("zstd history compression needs the 'zstandard' package")
+        self.dest_root = Path(dest_root)
+        self.dir = self.dest_root / HISTORY_DIR
+        self.legacy_file = self.dest_root / LEGACY_HISTORY_FILE
+        self.compact_encoding = compact
+        self.compression = compression
+        self.keep_last = keep_last
+        self.keep_days = keep_days
+
+    # ----------------------------------------------------
+    # STATE
+    # ----------------------------------------------------
+
+    def exists(self) -> bool:
+        return (self.dir / STATE_FILE).exists() or self.legacy_file.exists()
+
+    def _migrate_legacy(self):
+        try:
+            with self.legacy_file.open("r", encoding="utf-8") as fh:
+                legacy = json.load(fh)
+        except ValueError as e:
+            # The old code silently started a fresh history over a
+            # corrupt file; do the same, but say so.
+            logger.warning("Discarding unreadable history %s: %s", self.legacy_file, e)
+            legacy = {}
+        entries = legacy.get("entries", [])
+        self.dir.mkdir(exist_ok=True)
+        for i, entry in enumerate(entries):
+            items = ((it["src"], it["dst"], it.get("moved", True)) for it in entry.get("items", []))
+            self._write_segment(i, entry, items)
+        pointer = legacy.get("pointer", len(entries) - 1)
+        self._write_state({"pointer": min(pointer, len(entries) - 1), "head": len(entries) - 1})
+        self.legacy_file.unlink()
+        logger.info("Migrated %d history entries from %s", len(entries), self.legacy_file)
+
+    def state(self) -> dict:
+        """
+        {"pointer": last applied entry id (-1: none), "head": last entry
+        id, "base": oldest entry still kept by retention}.
+        """
+        if not (self.dir / STATE_FILE).exists() and self.legacy_file.exists():
+            self._migrate_legacy()
+        try:
+            with (self.dir / STATE_FILE).open("r", encoding="utf-8") as fh:
+                state = json.load(fh)
+        except FileNotFoundError:
+            return {"pointer": -1, "head": -1, "base": 0}
+        except ValueError as e:
+            raise HistoryError(f"Corrupt history state: {e}")
+        return {
+            "pointer": int(state.get("pointer", -1)),
+            "head": int(state.get("head", -1)),
+            "base": int(state.get("base", 0)),
+        }
+
+    def _write_state(self, state: dict):
+        tmp = self.dir / (STATE_FILE + ".tmp")
+        with tmp.open("w", encoding="utf-8") as fh:
+            json.dump(state, fh)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, self.dir / STATE_FILE)
+
+    def set_pointer(self, pointer: int):
+        state = self.state()
+        state["pointer"] = pointer
+        self._write_state(state)
+
+    # ----------------------------------------------------
+    # SEGMENTS
+    # ----------------------------------------------------
+
+    def _segment_path(self, entry_id: int) -> Path:
+        base = self.dir / f"{entry_id:09d}{SEGMENT_SUFFIX}"
+        for suffix in COMPRESSION_SUFFIXES.values():
+            candidate = base.with_name(base.name + suffix)
+            if candidate.exists():
+                return candidate
+        return base
+
+    def _delete_segment(self, entry_id: int):
+        base = self.dir / f"{entry_id:09d}{SEGMENT_SUFFIX}"
+        for suffix in COMPRESSION_SUFFIXES.values():
+            try:
+                base.with_name(base.name + suffix).unlink()
+            except FileNotFoundError:
+                pass
+
+    def _install(self, writer: SegmentWriter, entry_id: int):
+        writer.close()
+        self._delete_segment(entry_id)
+        os.replace(writer.tmp, self.dir / f"{entry_id:09d}{writer.suffix}")
+
+    def _write_segment(self, entry_id: int, header: dict, items: Iterable[Item]):
+        writer = SegmentWriter(self.dir, header, self.compact_encoding, self.compression)
+        try:
+            for src, dst, moved in items:
+                writer.add(src, dst, moved)
+            self._install(writer, entry_id)
+        except BaseException:
+            writer.abort()
+            raise
+
+    def begin(self, header: dict) -> SegmentWriter:
+        """
+        Start recording an operation whose items are only known as it
+        runs; feed them to `add()` and pass the writer to commit().
+        """
+        # state() first: it migrates a legacy history file if needed.
+        self.state()
+        self.dir.mkdir(exist_ok=True)
+        return SegmentWriter(self.dir, header, self.compact_encoding, self.compression)
+
+    def commit(self, writer: SegmentWriter) -> int:
+        """Record `writer`'s segment after the current pointer; drops any redo branch."""
+        try:
+            state = self.state()
+            entry_id = state["pointer"] + 1
+            for stale in range(entry_id + 1, state["head"] + 1):
+                self._delete_segment(stale)
+            self._install(writer, entry_id)
+        except BaseException:
+            writer.abort()
+            raise
+        base = self._apply_retention(max(state["base"], 0), entry_id)
+        self._write_state({"pointer": entry_id, "head": entry_id, "base": base})
+        return entry_id
+
+    def append(self, header: dict, items: Iterable[Item]) -> int:
+        """Record a new operation after the current pointer; drops any redo branch."""
+        writer = self.begin(header)
+        try:
+            # A MovedItems container hands over its folder/name parts
+            # directly: no full paths built just to be split again.
+            iter_parts = getattr(items, "iter_parts", None)
+            if iter_parts is not None:
+                for parts in iter_parts():
+                    writer.add_parts(*parts)
+            else:
+                for src, dst, moved in items:
+                    writer.add(src, dst, moved)
+        except BaseException:
+            writer.abort()
+            raise
+        return self.commit(writer)
+
+    def _apply_retention(self, base: int, head: int) -> int:
+        """Delete segments outside the retention policy; returns the new base."""
+        new_base = base
+        if self.keep_last is not None:
+            new_base = max(new_base, head - max(1, self.keep_last) + 1)
+        if self.keep_days is not None:
+            cutoff = time.time() - self.keep_days * 86400
+            # The newest entry is always kept.
+            while new_base < head:
+                try:
+                    if self.read_header(new_base).get("timestamp", 0) >= cutoff:
+                        break
+                except (OSError, ValueError, HistoryError):
+                    pass
+                new_base += 1
+        for entry_id in range(base, new_base):
+            self._delete_segment(entry_id)
+        return new_base
+
+    def compact(self) -> dict:
+        """Rewrite all kept segments in this store's encoding; apply retention."""
+        state = self.state()
+        if state["head"] < 0:
+            return {"rewritten": 0, "pruned": 0, "bytes_before": 0, "bytes_after": 0}
+        base = self._apply_retention(state["base"], state["head"])
+        pruned = base - state["base"]
+        state["base"] = base
+        self._write_state(state)
+        result = {"rewritten": 0, "pruned": pruned, "bytes_before": 0, "bytes_after": 0}
+        for entry_id in range(base, state["head"] + 1):
+            try:
+                before = self._segment_path(entry_id).stat().st_size
+            except FileNotFoundError:
+                continue
+            header = self.read_header(entry_id)
+            # Materialise first: the old file is replaced by the new one.
+            items = list(self.iter_items(entry_id))
+            self._write_segment(entry_id, header, items)
+            result["rewritten"] += 1
+            result["bytes_before"] += before
+            result["bytes_after"] += self._segment_path(entry_id).stat().st_size
+        return result
+
+    def read_header(self, entry_id: int) -> dict:
+        with _open_segment(self._segment_path(entry_id), "r") as fh:
+            header = json.loads(fh.readline())
+        header.pop("format", None)
+        return header
+
+    def iter_items(self, entry_id: int) -> Iterator[Item]:
+        with _open_segment(self._segment_path(entry_id), "r") as fh:
+            header = json.loads(fh.readline())
+            if header.get("format") != COMPACT_FORMAT:
+                for line in fh:
+                    if line.strip():
+                        src, dst, moved = json.loads(line)
+                        yield src, dst, moved
+                return
+            dirs: Dict[int, str] = {}
+            for line in fh:
+                if not line.strip():
+                    continue
+                rec = json.loads(line)
+                if rec[0] == "D":
+                    _, dir_id, parent_id, name = rec
+                    dirs[dir_id] = name if parent_id < 0 else os.path.join(dirs[parent_id], name)
+                    continue
+                src_dir, src_name, dst_dir, dst_name, moved = rec
+                yield (
+                    os.path.join(dirs[src_dir], src_name),
+                    os.path.join(dirs[dst_dir], src_name if dst_name is None else dst_name),
+                    bool(moved),
+                )
+
+    def read_entry(self, entry_id: int) -> dict:
+        """Full entry in the legacy dict shape (header + "items" list)."""
+        entry = self.read_header(entry_id)
+        entry["items"] = [{"src": s, "dst": d, "moved": m} for s, d, m in self.iter_items(entry_id)]
+        return entry
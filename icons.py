@@ -6,8 +6,15 @@ in the folder preview grid.
 from pathlib import Path
 from PIL import Image, ImageDraw, ImageFont
 
+from categories import get_registry
+
 FILE_ICONS = {}
 
+# Thumbnails are attempted for anything the category registry files
+# under this category; PIL falls back to a plain tile if it can't
+# decode the format.
+IMAGE_CATEGORY = "Images"
+
 FILE_TYPE_COLORS = {
     ".txt": (56, 189, 248, 255),
     ".py": (250, 204, 21, 255),
@@ -25,6 +32,19 @@ FILE_TYPE_COLORS = {
     ".xlsx": (34, 197, 94, 255),
 }
 
+# Fallback tile colour for extensions without their own entry above
+# (including user-defined ones), picked by category.
+CATEGORY_COLORS = {
+    "Images": (251, 146, 60, 255),
+    "Documents": (56, 189, 248, 255),
+    "Code": (250, 204, 21, 255),
+    "Videos": (251, 146, 60, 255),
+    "Audio": (244, 114, 182, 255),
+    "Archives": (168, 85, 247, 255),
+    "Spreadsheets": (34, 197, 94, 255),
+    "Presentations": (239, 68, 68, 255),
+}
+
 
 def get_file_icon(file_path: Path, size=(56, 56)):
     """
@@ -32,14 +52,16 @@ def get_file_icon(file_path: Path, size=(56, 56)):
     """
 
     suffix = file_path.suffix.lower()
-    key = ("DIR" if file_path.is_dir() else suffix)
+    is_dir = file_path.is_dir()
+    category = get_registry().category_for_name(file_path.name)
+    # Category is part of the key so a remapped extension gets a
+    # fresh tile after the category settings change.
+    key = ("DIR" if is_dir else (category, suffix))
+    is_image = category == IMAGE_CATEGORY
 
     # Do not cache real image thumbnails by extension.
     # Otherwise every JPG would display the same image.
-    cacheable = not (
-        suffix in [".png", ".jpg", ".jpeg", ".gif", ".bmp", ".webp"]
-        and file_path.is_file()
-    )
+    cacheable = not (is_image and not is_dir)
 
     if cacheable and key in FILE_ICONS:
         return FILE_ICONS[key]
@@ -52,7 +74,7 @@ def get_file_icon(file_path: Path, size=(56, 56)):
     # DIRECTORY
     # --------------------------------------------------------
 
-    if file_path.is_dir():
+    if is_dir:
 
         # Shadow
         draw.rounded_rectangle(
@@ -91,7 +113,7 @@ def get_file_icon(file_path: Path, size=(56, 56)):
     # IMAGE THUMBNAIL
     # --------------------------------------------------------
 
-    elif suffix in [".png", ".jpg", ".jpeg", ".gif", ".bmp", ".webp"]:
+    elif is_image:
 
         try:
             im = Image.open(file_path).convert("RGBA")
@@ -128,7 +150,7 @@ def get_file_icon(file_path: Path, size=(56, 56)):
 
         color = FILE_TYPE_COLORS.get(
             suffix,
-            (100, 116, 139, 255)
+            CATEGORY_COLORS.get(category, (100, 116, 139, 255))
         )
 
         # file background
@@ -1,24 +1,147 @@
 """
 Logging configuration for the Smart File Organizer.
+
+Large runs log one "Moved: ..." line per file. By default those go
+synchronously through the console and rotating-file handlers, so
+formatting plus a flushed write per file lands on the mover threads.
+Two knobs make that cheaper:
+
+  - async_mode: the logger only puts records on a queue; a background
+    listener formats them and writes in batches, flushing each handler
+    once per batch instead of once per line
+  - per_file: "all" (default), "sample" (every Nth per-file line) or
+    "summary" (one "N files moved" line per N) -- applied before a
+    record is queued, so dropped lines cost almost nothing
+
+Per-file lines are the ones logged with `extra={"per_file": True}`.
 """
 
+import queue
+import atexit
 import logging
+import threading
 from pathlib import Path
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
 LOG_FILE = Path("sorted_files_log.txt")
 SETTINGS_FILE = Path("organizer_settings.json")
 
+PER_FILE_MODES = ("all", "sample", "summary")
+# Most records written per listener batch.
+LOG_BATCH_SIZE = 512
+
+_listener = None
+
+
+class PerFileFilter(logging.Filter):
+    """Samples or summarizes records marked `per_file`."""
+
+    def __init__(self, mode: str = "all", every: int = 100):
+        super().__init__()
+        if mode not in PER_FILE_MODES:
+            raise ValueError(f"Unsupported per-file log mode: {mode}")
+        self.mode = mode
+        self.every = max(1, every)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.mode == "all" or not getattr(record, "per_file", False):
+            return True
+        with self._lock:
+            self._count += 1
+            count = self._count
+        if count % self.every:
+            return False
+        if self.mode == "summary":
+            latest = record.getMessage()
+            record.msg = "%d files moved so far (latest: %s)"
+            record.args = (count, latest)
+        return True
+
+
+class _BatchFlush:
+    """Handler mixin: emit() leaves flushing to the listener, once per batch."""
+
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        super().flush()
+
+    def close(self):
+        self.flush_batch()
+        super().close()
+
+
+class BatchStreamHandler(_BatchFlush, logging.StreamHandler):
+    pass
 
-def setup_logger(level=logging.INFO) -> logging.Logger:
+
+class BatchRotatingFileHandler(_BatchFlush, RotatingFileHandler):
+    pass
+
+
+class _DeferredQueueHandler(QueueHandler):
+
+    def prepare(self, record):
+        # QueueHandler.prepare() formats on the caller's thread; the
+        # queue never leaves the process, so hand the record over as is
+        # and let the listener do the formatting.
+        return record
+
+
+class BatchQueueListener(QueueListener):
+    """QueueListener that drains up to LOG_BATCH_SIZE records per wake-up."""
+
+    def _monitor(self):
+        q = self.queue
+        while True:
+            batch = [q.get()]
+            while len(batch) < LOG_BATCH_SIZE:
+                try:
+                    batch.append(q.get_nowait())
+                except queue.Empty:
+                    break
+            stop = False
+            for record in batch:
+                if record is self._sentinel:
+                    stop = True
+                else:
+                    self.handle(record)
+            for handler in self.handlers:
+                if isinstance(handler, _BatchFlush):
+                    handler.flush_batch()
+            for _ in batch:
+                q.task_done()
+            if stop:
+                return
+
+
+def stop_listener():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+def setup_logger(level=logging.INFO, async_mode=False, per_file="all", per_file_every=100) -> logging.Logger:
+    global _listener
     logger = logging.getLogger("smart_organizer")
     logger.setLevel(level)
 
-    ch = logging.StreamHandler()
+    stop_listener()
+
+    stream_cls = BatchStreamHandler if async_mode else logging.StreamHandler
+    file_cls = BatchRotatingFileHandler if async_mode else RotatingFileHandler
+
+    ch = stream_cls()
     ch.setLevel(level)
     ch.setFormatter(logging.Formatter("%(message)s"))
 
-    fh = RotatingFileHandler(
+    fh = file_cls(
         str(LOG_FILE),
         maxBytes=5_000_000,
         backupCount=5,
@@ -33,12 +156,27 @@ def setup_logger(level=logging.INFO) -> logging.Logger:
         )
     )
 
+    for handler in logger.handlers:
+        handler.close()
     logger.handlers = []
-    logger.addHandler(ch)
-    logger.addHandler(fh)
+    logger.filters = []
+    if per_file != "all":
+        logger.addFilter(PerFileFilter(per_file, per_file_every))
+
+    if async_mode:
+        log_queue = queue.Queue()
+        _listener = BatchQueueListener(log_queue, ch, fh, respect_handler_level=True)
+        _listener.start()
+        logger.addHandler(_DeferredQueueHandler(log_queue))
+    else:
+        logger.addHandler(ch)
+        logger.addHandler(fh)
     logger.propagate = False
 
     return logger
 
 
+# Flush whatever the listener still holds when the process exits.
+atexit.register(stop_listener)
+
 logger = setup_logger()
@@ -6,10 +6,21 @@ GUI mode:
 
 CLI mode (no window, for automation / scripting):
     python main.py <folder> --no-gui [--dry-run] [--include-hidden] [--duplicates]
+                                     [--categories rules.json] [--jobs N] [--json] [--flat]
+                                     [--exclude PATTERN ...] [--min-size SIZE] [--max-size SIZE]
+                                     [--no-hash-cache] [--hash-algorithm ALGO] [--hash-jobs N]
+                                     [--incremental] [--keep-empty-dirs]
+                                     [--no-progress] [--log-async] [--log-per-file all|sample|summary] [--log-every N]
+                                     [--history-keep N] [--history-keep-days DAYS]
+                                     [--history-compress gzip|zstd] [--compact-history]
+                                     [--profile FILE] [--plan FILE] [--execute-plan FILE]
 """
 
 import sys
+import json
+import pstats
 import argparse
+import cProfile
 import tkinter as tk
 from pathlib import Path
 
@@ -26,7 +37,174 @@ except Exception:
     pass
 
 from app import SmartOrganizerApp
-from file_sorter import sort_directory
+from file_sorter import execute_plan, iter_sort, plan_sort
+from events import DuplicateFound, Finished, Moved, MoveFailed
+from plan import SortPlan
+from categories import configure_registry, read_config
+from hashing import DEFAULT_ALGORITHM, DEFAULT_HASH_WORKERS, HASH_ALGORITHMS
+from history import HISTORY_COMPRESSIONS, HistoryStore
+from progress import format_event
+from logging_setup import PER_FILE_MODES, SETTINGS_FILE, setup_logger
+
+
+def load_categories(args):
+
+    # Same category rules the GUI uses (organizer_settings.json), with
+    # an optional --categories file layered on top.
+    settings = {}
+
+    try:
+        if SETTINGS_FILE.exists():
+            settings = read_config(SETTINGS_FILE)
+    except Exception:
+        settings = {}
+
+    registry = configure_registry(settings)
+
+    if args.categories:
+        registry.apply_config(read_config(Path(args.categories)))
+
+
+SIZE_UNITS = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+
+
+def parse_size(text: str) -> int:
+
+    # "1500", "64K", "10M", "2.5GiB" -- binary units, B / iB optional.
+    value = text.strip().upper()
+    if value.endswith("IB"):
+        value = value[:-2]
+    elif value.endswith("B"):
+        value = value[:-1]
+    factor = SIZE_UNITS.get(value[-1:], 1)
+    if factor != 1:
+        value = value[:-1]
+    try:
+        size = float(value) * factor
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid size: {text!r}")
+    if size < 0:
+        raise argparse.ArgumentTypeError(f"invalid size: {text!r}")
+    return int(size)
+
+
+def history_options(args) -> dict:
+    return {"compression": args.history_compress,
+            "keep_last": args.history_keep,
+            "keep_days": args.history_keep_days}
+
+
+def cli_progress(args):
+
+    # A single self-overwriting status line on an interactive terminal;
+    # nothing when output is piped or --no-progress is given.
+    if args.no_progress or not sys.stderr.isatty():
+        return None
+
+    def show(event):
+        line = format_event(event)
+        end = "\n" if event.phase == "done" else ""
+        sys.stderr.write(f"\r\033[K{line}{end}")
+        sys.stderr.flush()
+
+    return show
+
+
+def emit_json(record):
+
+    # One NDJSON line per record on stdout; logs and progress stay on stderr.
+    sys.stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def fail(args, message):
+
+    if args.json:
+        emit_json({"type": "error", "error": message})
+        sys.stdout.flush()
+    else:
+        print(message)
+    sys.exit(1)
+
+
+def json_item(kind, src, dst, moved):
+    emit_json({"type": kind, "src": src, "dst": dst, "moved": moved})
+
+
+def json_event(event):
+    if isinstance(event, Moved):
+        json_item(event.kind, event.src, event.dst, event.moved)
+    elif isinstance(event, MoveFailed):
+        emit_json({"type": "error", **event.as_dict()})
+    elif isinstance(event, DuplicateFound):
+        emit_json({"type": "duplicate_found", **event.as_dict()})
+
+
+def json_summary(summary, dry_run):
+    record = {
+        "type": "summary",
+        "dry_run": dry_run,
+        "total_files": summary["total_files"],
+        "moved": summary["moved_count"],
+        "duplicates": summary.get("duplicate_count", 0),
+        "errors": len(summary.get("errors", [])),
+        "removed_dirs": len(summary.get("removed_dirs", [])),
+        "duration_seconds": summary["duration_seconds"],
+        "timings": summary.get("timings", {}),
+        "counters": summary.get("counters", {}),
+        "transfer": summary.get("transfer", {}),
+    }
+    if "skipped" in summary:
+        record["skipped"] = len(summary["skipped"])
+        record["diverged"] = summary["diverged"]
+    for key in ("duplicate_stats", "hash_cache"):
+        if key in summary:
+            record[key] = summary[key]
+    emit_json(record)
+
+
+def print_profile(profiler, path):
+
+    # Full dump for snakeviz / `python -m pstats FILE`; the top of the
+    # cumulative listing goes to stderr so the summary stays parseable.
+    profiler.dump_stats(path)
+    print(f"Profile written to {path}", file=sys.stderr)
+    pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(15)
+
+
+def write_plan(args, folder):
+
+    try:
+        plan = plan_sort(
+            folder,
+            preserve_structure=not args.flat,
+            include_hidden=args.include_hidden,
+            exclude_patterns=args.exclude,
+            min_size_bytes=args.min_size,
+            max_size_bytes=args.max_size
+        )
+        plan.save(Path(args.plan))
+    except Exception as e:
+        fail(args, f"Failed to build plan: {e}")
+
+    if args.json:
+        emit_json(dict(plan.header(), type="plan", path=args.plan))
+    else:
+        print(f"Plan: {len(plan)} files, {plan.collisions} renamed to avoid collisions -> {args.plan}")
+        for category, count in sorted(plan.by_category().items()):
+            print(f"  {category}: {count}")
+    sys.exit(0)
+
+
+def load_plan(args, folder):
+
+    try:
+        plan = SortPlan.load(Path(args.execute_plan))
+    except Exception as e:
+        fail(args, f"Failed to load plan: {e}")
+    # A plan names absolute paths; refuse to run one made for another folder.
+    if Path(plan.root) != folder.resolve():
+        fail(args, f"Plan was made for {plan.root}, not {folder.resolve()}")
+    return plan
 
 
 def run_cli(args):
@@ -34,30 +212,141 @@ def run_cli(args):
     folder = Path(args.folder)
 
     if not folder.exists():
-        print("Folder not found:", folder)
-        sys.exit(1)
+        fail(args, f"Folder not found: {folder}")
+
+    if args.compact_history:
+        try:
+            result = HistoryStore(folder.resolve(), **history_options(args)).compact()
+        except Exception as e:
+            print("Failed to compact history:", e)
+            sys.exit(1)
+        print(
+            f"History: {result['rewritten']} entries rewritten, {result['pruned']} pruned, "
+            f"{result['bytes_before'] / 1024:.1f} KiB -> {result['bytes_after'] / 1024:.1f} KiB"
+        )
+        sys.exit(0)
+
+    if args.log_async or args.log_per_file != "all":
+        setup_logger(async_mode=args.log_async, per_file=args.log_per_file, per_file_every=args.log_every)
 
     try:
+        load_categories(args)
+    except Exception as e:
+        fail(args, f"Failed to load category rules: {e}")
 
-        summary = sort_directory(
-            root_dir=folder,
-            dest_root=folder,
-            preserve_structure=True,
-            dry_run=args.dry_run,
-            include_hidden=args.include_hidden,
-            compute_duplicates=args.duplicates
-        )
+    if args.plan:
+        write_plan(args, folder)
+
+    plan = load_plan(args, folder) if args.execute_plan else None
+    profiler = cProfile.Profile() if args.profile else None
+
+    try:
+
+        if profiler:
+            profiler.enable()
+        try:
+            if plan is not None:
+                summary = execute_plan(
+                    plan,
+                    workers=args.jobs,
+                    history_options=history_options(args),
+                    remove_empty_dirs=not args.keep_empty_dirs,
+                    on_progress=cli_progress(args),
+                    on_item=json_item if args.json else None,
+                    dry_run=args.dry_run
+                )
+            else:
+                # The CLI never needs the per-file list afterwards: items
+                # are streamed (to --json and the history) as they finish,
+                # so memory doesn't grow with the number of files.
+                summary = None
+                for event in iter_sort(
+                    root_dir=folder,
+                    dest_root=folder,
+                    preserve_structure=not args.flat,
+                    dry_run=args.dry_run,
+                    include_hidden=args.include_hidden,
+                    exclude_patterns=args.exclude,
+                    min_size_bytes=args.min_size,
+                    max_size_bytes=args.max_size,
+                    compute_duplicates=args.duplicates,
+                    workers=args.jobs,
+                    use_hash_cache=not args.no_hash_cache,
+                    hash_algorithm=args.hash_algorithm,
+                    hash_workers=args.hash_jobs,
+                    incremental_duplicates=args.incremental,
+                    history_options=history_options(args),
+                    remove_empty_dirs=not args.keep_empty_dirs,
+                    on_progress=cli_progress(args),
+                    pipeline=True,
+                    keep_items=False,
+                    continue_on_error=True,
+                    events=(Moved, MoveFailed, DuplicateFound) if args.json else ()
+                ):
+                    if isinstance(event, Finished):
+                        summary = event.summary
+                    else:
+                        json_event(event)
+        finally:
+            if profiler:
+                profiler.disable()
+                print_profile(profiler, args.profile)
+
+        # Files that failed to move were skipped; the run still counts
+        # as failed.
+        status = 1 if summary.get("errors") else 0
+        if args.json:
+            json_summary(summary, args.dry_run)
+            sys.stdout.flush()
+            sys.exit(status)
 
         print("Summary:")
         print(f"Total files scanned: {summary['total_files']}")
         print(f"Moved: {summary['moved_count']}")
         print(f"Duplicates found: {summary.get('duplicate_count', 0)}")
+        if summary.get("errors"):
+            print(f"Failed to move: {len(summary['errors'])} (see the log)")
 
-        sys.exit(0)
+        if "skipped" in summary:
+            print(
+                f"Plan: {len(summary['skipped'])} skipped (missing or changed since planning), "
+                f"{summary['diverged']} renamed differently than planned"
+            )
+
+        stats = summary.get("duplicate_stats")
+        if stats:
+            print(
+                f"Duplicate check ({stats['mode']}): {stats['sample_hashed']} sampled, "
+                f"{stats['full_hashed']} fully hashed, "
+                f"{stats['bytes_avoided'] / 1_048_576:.1f} MiB not read"
+            )
+
+        transfer = summary.get("transfer")
+        if transfer and transfer["copied"]:
+            print(
+                f"Cross-device copies: {transfer['copied']} files, "
+                f"{transfer['bytes_copied'] / 1_048_576:.1f} MiB at "
+                f"{transfer['copy_bytes_per_second'] / 1_048_576:.1f} MiB/s "
+                f"({', '.join(f'{k}: {v}' for k, v in sorted(transfer['methods'].items()))})"
+            )
+
+        cache = summary.get("hash_cache")
+        if cache:
+            print(
+                f"Hash cache: {cache['hits']} hits, {cache['misses']} misses, "
+                f"{cache['invalidated']} invalidated, {cache['pruned']} pruned"
+            )
+
+        timings = summary.get("timings")
+        if timings:
+            print("Timings: " + ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in timings.items()))
+            counters = summary["counters"]
+            print("Counters: " + ", ".join(f"{name} {value:,}" for name, value in counters.items()))
+
+        sys.exit(status)
 
     except Exception as e:
-        print("Error during sorting:", e)
-        sys.exit(1)
+        fail(args, f"Error during sorting: {e}")
 
 
 def run_gui():
@@ -92,6 +381,30 @@ def main():
     parser.add_argument("--no-gui", action="store_true", help="Run in CLI mode and exit")
     parser.add_argument("--include-hidden", action="store_true", help="Include hidden files")
     parser.add_argument("--duplicates", action="store_true", help="Compute duplicates (hash)")
+    parser.add_argument("--incremental", action="store_true", help="With --duplicates: only check this run's files against the index of already-sorted files")
+    parser.add_argument("--hash-algorithm", choices=HASH_ALGORITHMS, default=DEFAULT_ALGORITHM, help="Hash used for duplicate detection (blake2b is usually fastest)")
+    parser.add_argument("--hash-jobs", type=int, default=None, metavar="N", help="Hash N files at once (default: %d)" % DEFAULT_HASH_WORKERS)
+    parser.add_argument("--no-hash-cache", action="store_true", help="Re-hash every file instead of using the persistent hash cache")
+    parser.add_argument("--jobs", type=int, default=1, metavar="N", help="Move files on N parallel workers (helps on network drives); "
+                        "--json then lists moves as they finish, not in scan order")
+    parser.add_argument("--json", action="store_true", help="Stream one JSON record per moved file / duplicate / error to stdout, then a summary record (NDJSON)")
+    parser.add_argument("--flat", action="store_true", help="Put files directly into their category folder instead of keeping the subfolder structure")
+    parser.add_argument("--exclude", action="append", default=None, metavar="PATTERN", help="Skip files matching this glob; end it with / to skip folders (repeatable)")
+    parser.add_argument("--min-size", type=parse_size, default=0, metavar="SIZE", help="Only sort files of at least SIZE (e.g. 500, 64K, 10M)")
+    parser.add_argument("--max-size", type=parse_size, default=None, metavar="SIZE", help="Only sort files of at most SIZE")
+    parser.add_argument("--categories", metavar="FILE", help="JSON file with custom_categories / extension_map rules")
+    parser.add_argument("--keep-empty-dirs", action="store_true", help="Leave source folders in place even when sorting empties them")
+    parser.add_argument("--no-progress", action="store_true", help="Don't show the live progress line on the terminal")
+    parser.add_argument("--log-async", action="store_true", help="Write the log from a background thread, in batches")
+    parser.add_argument("--log-per-file", choices=PER_FILE_MODES, default="all", help="Log every moved file, every Nth one (sample), or a running count (summary)")
+    parser.add_argument("--log-every", type=int, default=100, metavar="N", help="N for --log-per-file sample/summary (default: 100)")
+    parser.add_argument("--history-keep", type=int, default=None, metavar="N", help="Keep only the last N sort operations in the undo history")
+    parser.add_argument("--history-keep-days", type=float, default=None, metavar="DAYS", help="Drop undo history older than DAYS days")
+    parser.add_argument("--history-compress", choices=HISTORY_COMPRESSIONS, default=None, help="Compress new undo history segments (zstd needs the 'zstandard' package)")
+    parser.add_argument("--compact-history", action="store_true", help="Rewrite the folder's undo history in the compact encoding, apply retention, and exit")
+    parser.add_argument("--plan", metavar="FILE", help="Don't move anything: write the sort plan (JSON lines) to FILE and exit")
+    parser.add_argument("--execute-plan", metavar="FILE", help="Carry out a plan written by --plan, without rescanning the folder")
+    parser.add_argument("--profile", metavar="FILE", help="Run the sort under cProfile and write the pstats dump to FILE")
     args = parser.parse_args()
 
     if args.folder and args.no_gui:
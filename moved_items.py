@@ -0,0 +1,97 @@
+"""
+Compact storage for the items a sort moved (summary["moved_items"]).
+
+Why this exists:
+moved_items used to be a list of `(src, dst, moved)` tuples -- two full
+path strings per file, although almost all files share a few thousand
+parent folders. On a 2M-file run that list alone held GBs of strings,
+and writing the history split every path again.
+
+MovedItems keeps each folder once, in a table, and per item only
+
+  - the source and destination folder indexes (two `array("I")`)
+  - the file name, plus the destination name only when it differs
+    (collision renames like "photo (1).jpg")
+  - one byte for the moved flag
+
+Iteration, len(), indexing and slicing return `(src, dst, moved)`
+tuples, so code written for the old list (e.g. SortMixin's "first 80
+entries" log) keeps working. iter_parts() yields the split form that
+HistoryStore writes, so recording a run never rebuilds full paths.
+"""
+
+import os
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+Item = Tuple[str, str, bool]
+# (src_dir, src_name, dst_dir, dst_name or None if same as src_name, moved)
+ItemParts = Tuple[str, str, str, Optional[str], bool]
+
+
+class MovedItems:
+    __slots__ = ("_dirs", "_dir_ids", "_src_dirs", "_dst_dirs", "_names", "_dst_names", "_moved")
+
+    def __init__(self, items: Iterable[Item] = ()):
+        self._dirs: List[str] = []
+        self._dir_ids: Dict[str, int] = {}
+        self._src_dirs = array("I")
+        self._dst_dirs = array("I")
+        self._names: List[str] = []
+        self._dst_names: List[Optional[str]] = []
+        self._moved = bytearray()
+        for item in items:
+            self.append(item)
+
+    def _intern(self, directory: str) -> int:
+        dir_id = self._dir_ids.get(directory)
+        if dir_id is None:
+            dir_id = self._dir_ids[directory] = len(self._dirs)
+            self._dirs.append(directory)
+        return dir_id
+
+    def append(self, item: Item):
+        src, dst, moved = item
+        src_dir, src_name = os.path.split(src)
+        dst_dir, dst_name = os.path.split(dst)
+        self._src_dirs.append(self._intern(src_dir))
+        self._dst_dirs.append(self._intern(dst_dir))
+        self._names.append(src_name)
+        self._dst_names.append(None if dst_name == src_name else dst_name)
+        self._moved.append(1 if moved else 0)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def _item(self, i: int) -> Item:
+        name = self._names[i]
+        dst_name = self._dst_names[i]
+        return (
+            os.path.join(self._dirs[self._src_dirs[i]], name),
+            os.path.join(self._dirs[self._dst_dirs[i]], name if dst_name is None else dst_name),
+            bool(self._moved[i]),
+        )
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._item(i) for i in range(*index.indices(len(self)))]
+        n = len(self)
+        if index < 0:
+            index += n
+        if not 0 <= index < n:
+            raise IndexError("moved item index out of range")
+        return self._item(index)
+
+    def __iter__(self) -> Iterator[Item]:
+        for i in range(len(self)):
+            yield self._item(i)
+
+    def iter_parts(self) -> Iterator[ItemParts]:
+        """Items as folder/name parts, without joining paths."""
+        dirs = self._dirs
+        for i in range(len(self)):
+            yield (dirs[self._src_dirs[i]], self._names[i], dirs[self._dst_dirs[i]],
+                   self._dst_names[i], bool(self._moved[i]))
+
+    def __repr__(self):
+        return f"MovedItems({len(self)} items, {len(self._dirs)} folders)"
@@ -0,0 +1,373 @@
+"""
+File moving for the sorter: picking a collision-free target name and
+actually moving the file, either one by one or on a thread pool.
+
+Why a pool:
+On network mounts (NFS/SMB) each rename is a round trip, so a serial
+move loop is latency-bound at a few hundred files per second no
+matter how fast the server is. MoveExecutor keeps several renames in
+flight at once.
+
+Why it is still race-free:
+`unique_target_path` checks which names already exist in the target
+folder, so two threads picking a name in the *same* folder could both
+choose "photo (1).jpg". Jobs are therefore grouped by destination
+directory and each group runs serially on a single worker, in input
+order -- only different folders are filled in parallel. Results are
+returned in input order, so `moved_items` and the history entry are
+identical to a serial run.
+
+run_stream() is the pipelined variant: it consumes jobs lazily (e.g.
+straight from a running scan) instead of needing the full list up
+front. Jobs are sharded to workers by destination directory, so the
+same per-folder ordering guarantee holds.
+
+The executor's moves go through transfer.Transfer: a plain rename on
+the same filesystem, a verified kernel-side copy across devices.
+"""
+
+import os
+import queue
+import shutil
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from transfer import Transfer
+
+logger = logging.getLogger("smart_organizer")
+
+MoveResult = Tuple[Path, Path, bool]
+
+# Per-worker backlog in streaming mode; keeps memory bounded while
+# the scan runs ahead of the movers.
+STREAM_QUEUE_SIZE = 256
+
+# Marks the slots of run() jobs that never got to run.
+_NOT_RUN = object()
+
+# Destination folders whose listing DirectoryNames keeps at once; the
+# least recently used one is dropped past this and re-read if needed.
+DIR_CACHE_SIZE = 512
+
+
+def ensure_dir(path: Path):
+    path.mkdir(parents=True, exist_ok=True)
+
+
+def unique_target_path(target: Path) -> Path:
+    if not target.exists():
+        return target
+    stem, suffix = target.stem, target.suffix
+    parent = target.parent
+    i = 1
+    while True:
+        candidate = parent / f"{stem} ({i}){suffix}"
+        if not candidate.exists():
+            return candidate
+        i += 1
+
+
+class DirectoryNames:
+    """
+    In-memory set of the names present in each destination folder,
+    listed once with scandir and updated as files land.
+
+    Why this exists:
+    `unique_target_path` probes `exists()` for "(1)", "(2)", ... one
+    syscall at a time, restarting at 1 for every file -- so flattening
+    thousands of `IMG_0001.jpg`-style names into one folder goes
+    quadratic. Here a free name is a set lookup, and the "(n)" counter
+    resumes per stem from where the previous collision left off.
+
+    Names are also reserved in dry runs, so a dry run now reports the
+    same "(n)" names a real run would produce.
+
+    Only the `max_dirs` most recently used folders are kept listed, so
+    memory doesn't grow with the size of the tree; a folder needed again
+    is re-read. Names reserved but not yet on disk are kept apart until
+    done() or release() and added back to a re-read listing -- in a dry
+    run, where they never reach the disk, that keeps every one of them.
+    """
+
+    def __init__(self, max_dirs: int = DIR_CACHE_SIZE):
+        self.max_dirs = max(1, max_dirs)
+        self._dirs: "OrderedDict[str, set]" = OrderedDict()
+        self._pending: Dict[str, set] = {}
+        self._next: Dict[str, Dict[Tuple[str, str], int]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name: str) -> str:
+        # Case-insensitive on Windows, like the filesystem itself.
+        return os.path.normcase(name)
+
+    def _names(self, parent: str) -> set:
+        names = self._dirs.get(parent)
+        if names is not None:
+            self._dirs.move_to_end(parent)
+            return names
+        try:
+            with os.scandir(parent) as it:
+                names = {self._key(e.name) for e in it}
+        except OSError:
+            # Not created yet -- nothing to collide with.
+            names = set()
+        names.update(self._pending.get(parent, ()))
+        self._dirs[parent] = names
+        while len(self._dirs) > self.max_dirs:
+            evicted, _ = self._dirs.popitem(last=False)
+            self._next.pop(evicted, None)
+        return names
+
+    def _take(self, parent: str, names: set, key: str):
+        names.add(key)
+        self._pending.setdefault(parent, set()).add(key)
+
+    def reserve(self, target: Path) -> Path:
+        """Pick a free name for `target` in its folder and mark it taken."""
+        parent = str(target.parent)
+        with self._lock:
+            names = self._names(parent)
+            if self._key(target.name) not in names:
+                self._take(parent, names, self._key(target.name))
+                return target
+            stem, suffix = target.stem, target.suffix
+            counters = self._next.setdefault(parent, {})
+            counter_key = (self._key(stem), self._key(suffix))
+            i = counters.get(counter_key, 1)
+            while self._key(f"{stem} ({i}){suffix}") in names:
+                i += 1
+            counters[counter_key] = i + 1
+            self._take(parent, names, self._key(f"{stem} ({i}){suffix}"))
+            return target.parent / f"{stem} ({i}){suffix}"
+
+    def _settle(self, parent: str, key: str):
+        pending = self._pending.get(parent)
+        if pending is not None:
+            pending.discard(key)
+            if not pending:
+                del self._pending[parent]
+
+    def done(self, path: Path):
+        """The file is now at its reserved name on disk."""
+        with self._lock:
+            self._settle(str(path.parent), self._key(path.name))
+
+    def release(self, path: Path):
+        """Give a reserved name back (the move didn't happen)."""
+        parent = str(path.parent)
+        with self._lock:
+            self._settle(parent, self._key(path.name))
+            names = self._dirs.get(parent)
+            if names is not None:
+                names.discard(self._key(path.name))
+
+    def forget(self, parent: Path):
+        """Drop the cached listing of `parent`; it's re-read on next use."""
+        with self._lock:
+            self._dirs.pop(str(parent), None)
+
+
+def move_file(
+    src: Path, dst: Path, dry_run=False, names: Optional[DirectoryNames] = None, transfer: Optional[Transfer] = None
+) -> Tuple[Path, bool]:
+    try:
+        same = transfer.same_file(src, dst) if transfer is not None else src.resolve() == dst.resolve()
+        if same:
+            # Already exactly where it needs to be (e.g. a duplicate
+            # re-scanned on a later run) -- nothing to do, and treating
+            # this as "needs a unique name" would just rename it to
+            # "(1)", "(2)"... on every subsequent run.
+            return dst, False
+    except Exception:
+        pass
+    if names is None:
+        final_dst = unique_target_path(dst)
+    else:
+        final_dst = names.reserve(dst)
+        exists = transfer.lexists if transfer is not None else os.path.lexists
+        if not dry_run and exists(final_dst):
+            # Something else created this name since the folder was
+            # listed -- never overwrite it; re-list and pick again.
+            names.forget(final_dst.parent)
+            final_dst = names.reserve(dst)
+    if dry_run:
+        logger.debug("[DRY-RUN] %s -> %s", src, final_dst, extra={"per_file": True})
+        return final_dst, False
+    try:
+        if transfer is None:
+            ensure_dir(final_dst.parent)
+            shutil.move(str(src), str(final_dst))
+        else:
+            transfer.ensure_dir(final_dst.parent)
+            transfer.move(src, final_dst)
+    except BaseException:
+        if names is not None:
+            names.release(final_dst)
+        raise
+    if names is not None:
+        names.done(final_dst)
+    logger.info("Moved: %s -> %s", src, final_dst, extra={"per_file": True})
+    return final_dst, True
+
+
+class MoveExecutor:
+
+    def __init__(
+        self,
+        workers: int = 1,
+        dry_run: bool = False,
+        on_moved: Optional[Callable[[Path, Path, bool], None]] = None,
+        transfer: Optional[Transfer] = None,
+        on_error: Optional[Callable[[Path, Path, Exception], None]] = None,
+    ):
+        self.workers = max(1, int(workers or 1))
+        self.dry_run = dry_run
+        self.on_moved = on_moved
+        # With on_error, a file that fails to move is reported there and
+        # its result is None; without it, the first failure aborts the run.
+        self.on_error = on_error
+        # on_moved is user code (e.g. a GUI progress callback) -- never
+        # call it from two threads at once.
+        self._callback_lock = threading.Lock()
+        self._abort = threading.Event()
+        self.names = DirectoryNames()
+        # Pass one in to share device lookups and stats across executors.
+        self.transfer = transfer if transfer is not None else Transfer()
+        # (index, result) of moves run_stream finished after its caller
+        # stopped iterating, or that run() completed before a failure.
+        self.unreported: List[Tuple[int, Optional[MoveResult]]] = []
+
+    def _move_one(self, src: Path, dst: Path) -> Optional[MoveResult]:
+        try:
+            final_dst, moved = move_file(src, dst, self.dry_run, self.names, self.transfer)
+        except Exception as e:
+            if self.on_error is None:
+                raise
+            with self._callback_lock:
+                self.on_error(src, dst, e)
+            return None
+        if self.on_moved:
+            with self._callback_lock:
+                self.on_moved(src, final_dst, moved)
+        return src, final_dst, moved
+
+    def _run_group(self, jobs: Sequence[Tuple[Path, Path]], indexes: List[int], results: List[Optional[MoveResult]]):
+        for i in indexes:
+            if self._abort.is_set():
+                return
+            try:
+                results[i] = self._move_one(*jobs[i])
+            except BaseException:
+                self._abort.set()
+                raise
+
+    def run(self, jobs: Sequence[Tuple[Path, Path]]) -> List[Optional[MoveResult]]:
+        """
+        Move every (src, dst) job; results come back in job order. If a
+        move raises, the moves that did complete are put in `unreported`
+        (in job order) before the error propagates, so the caller can
+        still record them.
+        """
+        results: List = [_NOT_RUN] * len(jobs)
+        try:
+            if self.workers == 1 or len(jobs) < 2:
+                for i, (src, dst) in enumerate(jobs):
+                    results[i] = self._move_one(src, dst)
+                return results
+
+            groups: Dict[Path, List[int]] = {}
+            for i, (_, dst) in enumerate(jobs):
+                groups.setdefault(dst.parent, []).append(i)
+
+            self._abort.clear()
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(groups))) as pool:
+                futures = [pool.submit(self._run_group, jobs, indexes, results) for indexes in groups.values()]
+            # Same failure behaviour as the serial loop: the first error
+            # aborts the run and propagates to the caller.
+            for fut in futures:
+                fut.result()
+            return results
+        except BaseException:
+            self.unreported.extend((i, r) for i, r in enumerate(results) if r is not _NOT_RUN)
+            raise
+
+    def run_stream(self, jobs: Iterable[Tuple[Path, Path]]) -> Iterator[Tuple[int, Optional[MoveResult]]]:
+        """
+        Move jobs as they arrive, yielding (job index, result) as each
+        one finishes. With one worker that is job order; with more,
+        sort by index if a deterministic order is needed.
+
+        Closing the iterator early stops taking new jobs; moves already
+        under way still finish and land in `unreported`. The close waits
+        for them, so `jobs` must end (or be exhausted) by then.
+        """
+        if self.workers == 1:
+            for i, (src, dst) in enumerate(jobs):
+                yield i, self._move_one(src, dst)
+            return
+
+        self._abort.clear()
+        inboxes = [queue.Queue(maxsize=STREAM_QUEUE_SIZE) for _ in range(self.workers)]
+        outbox: "queue.Queue" = queue.Queue()
+        errors: List[BaseException] = []
+        done = object()
+
+        def dispatch():
+            try:
+                for i, (src, dst) in enumerate(jobs):
+                    if self._abort.is_set():
+                        break
+                    inboxes[hash(dst.parent) % self.workers].put((i, src, dst))
+            except BaseException as e:
+                self._abort.set()
+                errors.append(e)
+            finally:
+                for inbox in inboxes:
+                    inbox.put(None)
+
+        def work(inbox):
+            while True:
+                item = inbox.get()
+                if item is None:
+                    outbox.put(done)
+                    return
+                if self._abort.is_set():
+                    # Keep draining so the dispatcher never blocks.
+                    continue
+                i, src, dst = item
+                try:
+                    outbox.put((i, self._move_one(src, dst)))
+                except BaseException as e:
+                    self._abort.set()
+                    errors.append(e)
+
+        threads = [threading.Thread(target=dispatch, daemon=True)]
+        threads += [threading.Thread(target=work, args=(inbox,), daemon=True) for inbox in inboxes]
+        for t in threads:
+            t.start()
+
+        finished = 0
+        try:
+            while finished < self.workers:
+                item = outbox.get()
+                if item is done:
+                    finished += 1
+                else:
+                    yield item
+        finally:
+            # Also reached when the caller stops iterating early.
+            self._abort.set()
+            while finished < self.workers:
+                item = outbox.get()
+                if item is done:
+                    finished += 1
+                else:
+                    self.unreported.append(item)
+
+        if errors:
+            raise errors[0]
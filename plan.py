@@ -0,0 +1,147 @@
+"""
+Sort plans: what a sort *would* do, as data.
+
+Why this exists:
+The only way to preview a sort was `dry_run=True`, which runs the
+whole sort_directory code path -- executor, name reservation, logging
+-- and throws the result away; the real run then scans and decides
+everything again, possibly differently if the tree changed in
+between.
+
+A SortPlan is the decision step on its own (file_sorter.plan_sort):
+one PlanEntry per file with its source, planned destination,
+category, the reason for that category and whether the destination
+had to be renamed ("photo (1).jpg") to avoid a collision. Entries are
+ordered by source path, so the same tree always gives the same plan
+and collision numbering.
+
+Plans are saved as JSON lines (a header, then one entry per line):
+
+    {"plan": 1, "root": "...", "dest_root": "...", "created": ..., ...}
+    {"src": "...", "dst": "...", "category": "Images", "reason": "extension .jpg", ...}
+
+which diffs cleanly with any text diff tool, or with diff_plans().
+file_sorter.execute_plan() carries a plan out later without
+rescanning; each entry records the source's size and mtime so files
+changed since planning are skipped rather than moved blindly.
+"""
+
+import json
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+PLAN_FORMAT = 1
+
+
+class PlanError(Exception):
+    pass
+
+
+class PlanEntry:
+    __slots__ = ("src", "dst", "category", "reason", "collision", "size", "mtime_ns")
+
+    def __init__(self, src: str, dst: str, category: str, reason: str, collision: bool = False,
+                 size: Optional[int] = None, mtime_ns: Optional[int] = None):
+        self.src = src
+        self.dst = dst
+        self.category = category
+        self.reason = reason
+        self.collision = collision
+        self.size = size
+        self.mtime_ns = mtime_ns
+
+    def as_dict(self) -> dict:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "PlanEntry":
+        try:
+            return cls(data["src"], data["dst"], data["category"], data.get("reason", ""),
+                       bool(data.get("collision", False)), data.get("size"), data.get("mtime_ns"))
+        except (KeyError, TypeError) as e:
+            raise PlanError(f"Malformed plan entry: {data!r}") from e
+
+    def __repr__(self):
+        return f"PlanEntry({self.as_dict()!r})"
+
+
+class SortPlan:
+
+    def __init__(self, root: str, dest_root: str, entries: Optional[List[PlanEntry]] = None,
+                 options: Optional[dict] = None, created: Optional[float] = None):
+        self.root = root
+        self.dest_root = dest_root
+        self.entries: List[PlanEntry] = entries if entries is not None else []
+        # The planning options (preserve_structure, filters...), kept
+        # for reference; execution only needs the entries.
+        self.options = options or {}
+        self.created = time.time() if created is None else created
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __iter__(self) -> Iterator[PlanEntry]:
+        return iter(self.entries)
+
+    @property
+    def collisions(self) -> int:
+        return sum(1 for e in self.entries if e.collision)
+
+    def by_category(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for e in self.entries:
+            counts[e.category] = counts.get(e.category, 0) + 1
+        return counts
+
+    def header(self) -> dict:
+        return {"plan": PLAN_FORMAT, "root": self.root, "dest_root": self.dest_root,
+                "created": self.created, "options": self.options,
+                "files": len(self.entries), "collisions": self.collisions}
+
+    def save(self, path: Path):
+        path = Path(path)
+        tmp = path.with_name(path.name + ".tmp")
+        with tmp.open("w", encoding="utf-8") as fh:
+            fh.write(json.dumps(self.header(), ensure_ascii=False) + "\n")
+            for e in self.entries:
+                fh.write(json.dumps(e.as_dict(), ensure_ascii=False) + "\n")
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> "SortPlan":
+        with Path(path).open("r", encoding="utf-8") as fh:
+            try:
+                header = json.loads(fh.readline())
+            except ValueError as e:
+                raise PlanError(f"Not a sort plan: {path}") from e
+            if not isinstance(header, dict) or header.get("plan") != PLAN_FORMAT:
+                raise PlanError(f"Not a sort plan (or an unsupported version): {path}")
+            entries = []
+            for line in fh:
+                if line.strip():
+                    try:
+                        entries.append(PlanEntry.from_dict(json.loads(line)))
+                    except ValueError as e:
+                        raise PlanError(f"Corrupt plan line in {path}: {e}") from e
+        return cls(header["root"], header["dest_root"], entries, header.get("options"), header.get("created"))
+
+
+def diff_plans(old: SortPlan, new: SortPlan) -> dict:
+    """
+    {"added": [new entries], "removed": [old entries], "changed":
+    [(old, new) pairs whose destination or category differ]}, matched
+    by source path.
+    """
+    old_by_src = {e.src: e for e in old.entries}
+    new_srcs = set()
+    added, changed = [], []
+    for e in new.entries:
+        new_srcs.add(e.src)
+        before = old_by_src.get(e.src)
+        if before is None:
+            added.append(e)
+        elif before.dst != e.dst or before.category != e.category:
+            changed.append((before, e))
+    removed = [e for e in old.entries if e.src not in new_srcs]
+    return {"added": added, "removed": removed, "changed": changed}
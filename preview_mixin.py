@@ -16,6 +16,7 @@ from pathlib import Path
 from PIL import ImageTk
 
 from icons import get_file_icon
+from categories import get_registry
 from tooltip import ToolTip
 from logging_setup import logger
 
@@ -183,7 +184,11 @@ class PreviewMixin:
         slot["name_label"].configure(text=name, bg=c["surface_2"], fg=c["text"])
         slot["frame"].configure(bg=c["surface_2"])
 
-        slot["tooltip"].text = item.name
+        if item.is_dir():
+            slot["tooltip"].text = item.name
+        else:
+            category = get_registry().category_for_name(item.name)
+            slot["tooltip"].text = f"{item.name}\n→ {category}"
         slot["path"] = item
 
     # ========================================================
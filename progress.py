@@ -0,0 +1,174 @@
+"""
+Throttled progress reporting for long runs.
+
+Why this exists:
+sort_directory used to call `progress_callback` after every single
+file, and the GUI turned each call into a ui_queue message plus a
+clock check -- at 100k files/sec that is 100k cross-thread messages
+for a progress bar that repaints a few times a second.
+
+ProgressTracker is fed by the core on every file (two integer adds
+and one monotonic() read) and calls its callback at most once per
+`interval` seconds, plus on every phase change and at the end. Each
+call gets a ProgressEvent with the current phase, counts, throughput
+(files/sec and bytes/sec since the phase started) and an ETA when the
+total is known.
+
+Phases of a sort: "scanning" -> "moving" -> "duplicates" ->
+"cleanup" -> "done". In pipeline mode "moving" starts while the scan
+is still running; `total` is None until the scan has finished.
+
+undo()/redo() report `(done, total)` per file from their worker
+threads; ReplayProgress turns that into the same throttled events.
+"""
+
+import time
+from typing import Callable, Optional
+
+PROGRESS_INTERVAL = 0.1
+
+
+class ProgressEvent:
+    __slots__ = (
+        "phase", "processed", "total", "bytes_done", "bytes_total",
+        "elapsed", "files_per_second", "bytes_per_second", "eta_seconds",
+    )
+
+    def __init__(self, phase, processed, total, bytes_done, bytes_total,
+                 elapsed, files_per_second, bytes_per_second, eta_seconds):
+        self.phase = phase
+        self.processed = processed
+        self.total = total
+        self.bytes_done = bytes_done
+        self.bytes_total = bytes_total
+        self.elapsed = elapsed
+        self.files_per_second = files_per_second
+        self.bytes_per_second = bytes_per_second
+        self.eta_seconds = eta_seconds
+
+    @property
+    def fraction(self) -> Optional[float]:
+        if not self.total:
+            return None
+        return min(1.0, self.processed / self.total)
+
+    def as_dict(self) -> dict:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    def __repr__(self):
+        return f"ProgressEvent({self.as_dict()!r})"
+
+
+def _clock(seconds: float) -> str:
+    seconds = int(seconds)
+    h, rest = divmod(seconds, 3600)
+    m, s = divmod(rest, 60)
+    return f"{h}:{m:02d}:{s:02d}" if h else f"{m}:{s:02d}"
+
+
+def format_event(event: ProgressEvent) -> str:
+    """One human-readable status line, shared by the GUI and the CLI."""
+    phase = event.phase.capitalize()
+    if event.total is not None:
+        count = f"{event.processed:,} / {event.total:,}"
+    else:
+        count = f"{event.processed:,}"
+    parts = [f"{phase}: {count}"]
+    if event.files_per_second:
+        parts.append(f"{event.files_per_second:,.0f} files/s")
+    if event.bytes_per_second:
+        parts.append(f"{event.bytes_per_second / 1_048_576:,.1f} MiB/s")
+    if event.eta_seconds is not None:
+        parts.append(f"ETA {_clock(event.eta_seconds)}")
+    return " · ".join(parts)
+
+
+class ProgressTracker:
+
+    def __init__(self, callback: Callable[[ProgressEvent], None], interval: float = PROGRESS_INTERVAL):
+        self.callback = callback
+        self.interval = interval
+        self.phase = "starting"
+        self.processed = 0
+        self.total: Optional[int] = None
+        self.bytes_done = 0
+        self.bytes_total: Optional[int] = None
+        self._run_start = self._phase_start = self._last = time.monotonic()
+
+    def set_phase(self, phase: str, total: Optional[int] = None, bytes_total: Optional[int] = None):
+        """Start a new phase (counters reset) and report it immediately."""
+        self.phase = phase
+        self.processed = 0
+        self.bytes_done = 0
+        self.total = total
+        self.bytes_total = bytes_total
+        self._phase_start = time.monotonic()
+        self.emit()
+
+    def finish(self, processed: int, nbytes: int = 0):
+        """Final "done" event; rates cover the whole run."""
+        self.phase = "done"
+        self.processed = self.total = processed
+        self.bytes_done = nbytes
+        self.bytes_total = None
+        self._phase_start = self._run_start
+        self.emit()
+
+    def advance(self, n: int = 1, nbytes: int = 0):
+        self.processed += n
+        self.bytes_done += nbytes
+        now = time.monotonic()
+        if now - self._last >= self.interval:
+            self.emit(now)
+
+    def event(self, now: Optional[float] = None) -> ProgressEvent:
+        now = time.monotonic() if now is None else now
+        elapsed = now - self._phase_start
+        fps = self.processed / elapsed if elapsed > 0 else 0.0
+        bps = self.bytes_done / elapsed if elapsed > 0 else 0.0
+        eta = None
+        if self.phase == "done":
+            pass
+        elif self.bytes_total and bps > 0:
+            eta = max(0.0, (self.bytes_total - self.bytes_done) / bps)
+        elif self.total is not None and fps > 0:
+            eta = max(0.0, (self.total - self.processed) / fps)
+        return ProgressEvent(self.phase, self.processed, self.total, self.bytes_done,
+                             self.bytes_total, elapsed, fps, bps, eta)
+
+    def emit(self, now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        self._last = now
+        try:
+            self.callback(self.event(now))
+        except Exception:
+            # A broken progress display must never abort the sort.
+            pass
+
+
+class ReplayProgress:
+    """
+    A `progress_callback(done, total)` for undo()/redo() that reports
+    through a ProgressTracker: `callback` gets a ProgressEvent in
+    `phase` at most every `interval` seconds, and when the count is
+    complete.
+    """
+
+    __slots__ = ("phase", "tracker")
+
+    def __init__(self, callback: Callable[[ProgressEvent], None], phase: str, interval: float = PROGRESS_INTERVAL):
+        self.phase = phase
+        self.tracker = ProgressTracker(callback, interval)
+
+    def __call__(self, done: int, total: int):
+        tracker = self.tracker
+        # A resumed replay of the other kind comes first and restarts
+        # the count.
+        if total != tracker.total or done <= tracker.processed:
+            tracker.set_phase(self.phase, total)
+        tracker.advance(done - tracker.processed)
+        if done >= total:
+            tracker.emit()
+
+    def finish(self, processed: int):
+        self.tracker.finish(processed)
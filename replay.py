@@ -0,0 +1,259 @@
+"""
+Undo/Redo replay engine.
+
+Why this exists:
+undo()/redo() used to replay a history entry one item at a time --
+`src.exists()` then `shutil.move` -- and only moved the history
+pointer at the very end. A crash or a closed window halfway through
+left the tree half-restored with nothing recording how far it got;
+running Undo again then reported every already-restored file as
+"Source not found" and still didn't know the operation was done.
+
+ReplayEngine replays one entry in a given direction:
+
+  - existence checks are batched: each directory involved is listed
+    once (os.listdir) and items are looked up in that set, instead of
+    one stat per file
+  - moves run on a thread pool, grouped by destination directory and
+    serial within a group (same rule as MoveExecutor)
+  - before the first move, an intent record ("undo entry 7, pointer
+    becomes 6") is written to `.sort_history/intent.jsonl`; completed
+    item indexes are appended in fsync'd batches as moves finish
+
+If the process dies mid-replay, the intent log survives. The next
+undo()/redo() resumes it: items logged as done are skipped outright,
+and items moved after the last checkpoint are recognised by the
+existence check (source gone, target present). Once every item is
+accounted for the pointer is updated and the intent log removed; an
+intent whose pointer update already happened is simply discarded.
+Setting `stop` ends a replay the same way on purpose: moves under way
+finish, the rest are left for the next undo()/redo() to resume.
+"""
+
+import os
+import json
+import shutil
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from history import HistoryStore, Item
+
+logger = logging.getLogger("smart_organizer")
+
+INTENT_FILE = "intent.jsonl"
+
+# Renames are metadata operations; a few in flight hide per-call
+# latency without thrashing a local disk.
+DEFAULT_REPLAY_WORKERS = min(4, os.cpu_count() or 1)
+
+# Completed items are fsync'd to the intent log in batches of this size.
+CHECKPOINT_EVERY = 256
+
+
+class _Listings:
+    """One os.listdir() per directory, reused for every item in it."""
+
+    def __init__(self):
+        self._names: Dict[str, Optional[Set[str]]] = {}
+
+    def exists(self, path: str) -> bool:
+        directory, name = os.path.split(path)
+        if directory not in self._names:
+            try:
+                self._names[directory] = {os.path.normcase(n) for n in os.listdir(directory)}
+            except OSError:
+                self._names[directory] = None
+        names = self._names[directory]
+        if names is None:
+            return False
+        if os.path.normcase(name) in names:
+            return True
+        # normcase() doesn't fold case on every case-insensitive
+        # filesystem (e.g. macOS); confirm misses with a real lookup.
+        return os.path.lexists(path)
+
+
+class ReplayEngine:
+
+    def __init__(
+        self,
+        store: HistoryStore,
+        workers: int = 1,
+        progress_callback: Optional[Callable[[int, int], None]] = None,
+        stop: Optional[threading.Event] = None,
+    ):
+        self.store = store
+        self.workers = max(1, int(workers or 1))
+        self.progress_callback = progress_callback
+        self.stop = stop
+        self.intent_path = store.dir / INTENT_FILE
+        self._lock = threading.Lock()
+
+    # ----------------------------------------------------
+    # INTENT LOG
+    # ----------------------------------------------------
+
+    def pending(self) -> Optional[dict]:
+        """The interrupted replay's intent header, if one needs resuming."""
+        try:
+            with self.intent_path.open("r", encoding="utf-8") as fh:
+                intent = json.loads(fh.readline())
+        except FileNotFoundError:
+            return None
+        except ValueError as e:
+            # Torn header: nothing was moved before it was written.
+            logger.warning("Discarding unreadable undo/redo intent log: %s", e)
+            self.discard()
+            return None
+        if self.store.state()["pointer"] == intent["pointer_after"]:
+            # Crashed after the pointer update, before cleanup.
+            self.discard()
+            return None
+        return intent
+
+    def _completed(self) -> Set[int]:
+        done: Set[int] = set()
+        try:
+            with self.intent_path.open("r", encoding="utf-8") as fh:
+                fh.readline()
+                for line in fh:
+                    try:
+                        done.update(json.loads(line))
+                    except ValueError:
+                        # A torn last line; those items are re-checked.
+                        break
+        except FileNotFoundError:
+            pass
+        return done
+
+    def _begin(self, op: str, entry_id: int, pointer_after: int):
+        self.store.dir.mkdir(exist_ok=True)
+        with self.intent_path.open("w", encoding="utf-8") as fh:
+            fh.write(json.dumps({"op": op, "entry": entry_id, "pointer_after": pointer_after}) + "\n")
+            fh.flush()
+            os.fsync(fh.fileno())
+
+    def discard(self):
+        try:
+            self.intent_path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def finish(self, pointer_after: int):
+        self.store.set_pointer(pointer_after)
+        self.discard()
+
+    # ----------------------------------------------------
+    # REPLAY
+    # ----------------------------------------------------
+
+    def run(self, op: str, entry_id: int, pointer_after: int, items: Iterable[Item]) -> dict:
+        """
+        Replay one entry: "undo" moves dst -> src in reverse order,
+        "redo" moves src -> dst. Resumes a matching intent log. Returns
+        {"moved", "already_done", "missing": [...], "errors": [...],
+        "interrupted"}; the pointer is not touched (see finish()).
+        """
+        intent = self.pending()
+        if intent is not None and (intent["op"], intent["entry"]) == (op, entry_id):
+            completed = self._completed()
+        else:
+            completed = set()
+            self._begin(op, entry_id, pointer_after)
+
+        items = list(items)
+        if op == "undo":
+            jobs = [(i, dst, src) for i, (src, dst, _) in reversed(list(enumerate(items)))]
+        else:
+            jobs = [(i, src, dst) for i, (src, dst, _) in enumerate(items)]
+
+        result = {"moved": 0, "already_done": 0, "missing": [], "errors": []}
+        listings = _Listings()
+        groups: Dict[str, List[Tuple[int, str, str]]] = {}
+        # One entry can move the same file twice (sorted, then moved on
+        # to Duplicates/), so planning tracks the tree as it will be
+        # after the moves planned so far, and a move whose source is an
+        # earlier move's target joins that move's group to run after it.
+        appeared: Set[str] = set()
+        vanished: Set[str] = set()
+        group_of: Dict[str, str] = {}
+        sources = {src for _, src, _ in jobs}
+
+        def exists(path: str) -> bool:
+            if path in appeared:
+                return True
+            return path not in vanished and listings.exists(path)
+
+        for i, src, dst in jobs:
+            if i in completed or src == dst:
+                result["already_done"] += 1
+            elif exists(src):
+                key = group_of.get(src, os.path.dirname(dst))
+                groups.setdefault(key, []).append((i, src, dst))
+                group_of[dst] = key
+                appeared.discard(src)
+                vanished.add(src)
+                vanished.discard(dst)
+                appeared.add(dst)
+            elif exists(dst) or dst in sources:
+                # Moved after the last checkpoint of an interrupted run
+                # (and possibly moved on again by a later item).
+                result["already_done"] += 1
+            else:
+                result["missing"].append(src)
+
+        total = sum(len(g) for g in groups.values())
+        state = {"done": 0, "batch": []}
+
+        with self.intent_path.open("a", encoding="utf-8") as log:
+
+            def checkpoint():
+                if state["batch"]:
+                    log.write(json.dumps(state["batch"]) + "\n")
+                    log.flush()
+                    os.fsync(log.fileno())
+                    state["batch"] = []
+
+            def run_group(group: List[Tuple[int, str, str]]):
+                created: Set[str] = set()
+                for i, src, dst in group:
+                    if self.stop is not None and self.stop.is_set():
+                        return
+                    try:
+                        parent = os.path.dirname(dst)
+                        if parent not in created:
+                            os.makedirs(parent, exist_ok=True)
+                            created.add(parent)
+                        shutil.move(src, dst)
+                        ok = True
+                    except Exception as e:
+                        ok = False
+                        error = f"Error moving {src} -> {dst}: {e}"
+                    with self._lock:
+                        if ok:
+                            result["moved"] += 1
+                            state["batch"].append(i)
+                            if len(state["batch"]) >= CHECKPOINT_EVERY:
+                                checkpoint()
+                        else:
+                            result["errors"].append(error)
+                        state["done"] += 1
+                        if self.progress_callback:
+                            try:
+                                self.progress_callback(state["done"], total)
+                            except Exception:
+                                pass
+
+            if self.workers == 1 or len(groups) < 2:
+                for group in groups.values():
+                    run_group(group)
+            else:
+                with ThreadPoolExecutor(max_workers=min(self.workers, len(groups))) as pool:
+                    for fut in [pool.submit(run_group, g) for g in groups.values()]:
+                        fut.result()
+            checkpoint()
+
+        result["interrupted"] = state["done"] < total
+        return result
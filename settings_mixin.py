@@ -13,6 +13,8 @@ except Exception:
     tb = None
 
 from logging_setup import SETTINGS_FILE
+from categories import configure_registry
+from hashing import DEFAULT_ALGORITHM, HASH_ALGORITHMS
 
 
 class SettingsMixin:
@@ -30,6 +32,7 @@ class SettingsMixin:
                 self.dry_run,
                 self.include_hidden,
                 self.compute_duplicates,
+                self.hash_algorithm,
                 self.selected_dir,
                 self.include_suffixes
             )
@@ -52,10 +55,15 @@ class SettingsMixin:
             "dry_run": self.dry_run.get(),
             "include_hidden": self.include_hidden.get(),
             "compute_duplicates": self.compute_duplicates.get(),
+            "hash_algorithm": self.hash_algorithm.get(),
             "include_suffixes": self.include_suffixes.get(),
             "theme": self.current_theme
         }
 
+        # Custom category rules have no UI of their own -- carry them
+        # over unchanged so an auto-save never drops them.
+        data.update(getattr(self, "_category_config", {}))
+
         try:
 
             with SETTINGS_FILE.open("w", encoding="utf-8") as fh:
@@ -77,11 +85,24 @@ class SettingsMixin:
             with SETTINGS_FILE.open("r", encoding="utf-8") as fh:
                 data = json.load(fh)
 
+            # Must happen before any Variable.set() below: each one
+            # fires an auto-save that would otherwise write the file
+            # back without the category rules.
+            self._category_config = {
+                key: data[key]
+                for key in ("custom_categories", "extension_map")
+                if isinstance(data.get(key), dict)
+            }
+            configure_registry(self._category_config)
+
             self.selected_dir.set(data.get("last_folder", ""))
             self.preserve_structure.set(data.get("preserve_structure", True))
             self.dry_run.set(data.get("dry_run", False))
             self.include_hidden.set(data.get("include_hidden", False))
             self.compute_duplicates.set(data.get("compute_duplicates", False))
+
+            algorithm = data.get("hash_algorithm", DEFAULT_ALGORITHM)
+            self.hash_algorithm.set(algorithm if algorithm in HASH_ALGORITHMS else DEFAULT_ALGORITHM)
             self.include_suffixes.set(data.get("include_suffixes", ""))
 
             theme = data.get("theme")
@@ -122,8 +143,8 @@ class SettingsMixin:
         win = tk.Toplevel(self.root)
 
         win.title("Smart Organizer — Settings")
-        win.geometry("520x470")
-        win.minsize(500, 450)
+        win.geometry("520x500")
+        win.minsize(500, 480)
         win.transient(self.root)
 
         c = self._colors()
@@ -216,6 +237,25 @@ class SettingsMixin:
                 anchor="w"
             ).pack(fill=tk.X, pady=2)
 
+        hash_row = tk.Frame(card, bg=c["surface"])
+        hash_row.pack(fill=tk.X, pady=(6, 0))
+
+        tk.Label(
+            hash_row,
+            text="Duplicate hash algorithm",
+            bg=c["surface"],
+            fg=c["text"],
+            font=("Segoe UI", 9)
+        ).pack(side=tk.LEFT)
+
+        ttk.Combobox(
+            hash_row,
+            textvariable=self.hash_algorithm,
+            values=HASH_ALGORITHMS,
+            state="readonly",
+            width=10
+        ).pack(side=tk.RIGHT)
+
         # ----------------------------------------------------
         # File types
         # ----------------------------------------------------
@@ -265,11 +305,15 @@ class SettingsMixin:
                 if SETTINGS_FILE.exists():
                     SETTINGS_FILE.unlink()
 
+                self._category_config = {}
+                configure_registry()
+
                 self.selected_dir.set("")
                 self.preserve_structure.set(True)
                 self.dry_run.set(False)
                 self.include_hidden.set(False)
                 self.compute_duplicates.set(False)
+                self.hash_algorithm.set(DEFAULT_ALGORITHM)
                 self.include_suffixes.set("")
 
                 self.current_theme = "dark"
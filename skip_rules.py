@@ -0,0 +1,142 @@
+"""
+Compiled skip rules for a single scan.
+
+Why this exists:
+The old per-file `_should_skip` rebuilt the protected-folder list,
+ran `is_relative_to()` once per category, checked every path part
+for a leading dot and evaluated each exclude glob separately -- for
+every single file. Worse, it could only reject files one by one, so
+a root that already held a 500k-file `Images/` folder still had all
+of those files listed and tested on every re-sort.
+
+SkipRules is built once per run and plugs straight into
+walker.walk_files():
+  - prune_dir() rejects whole directories (hidden folders, category
+    folders inside dest_root, the organizer's own bookkeeping folders,
+    `dir/` exclude patterns) so the walk never descends into them
+  - skip_file() is a set lookup plus a single pre-compiled regex
+    covering every exclude glob
+
+Exclude globs keep `Path.match` semantics: relative patterns match
+from the right (`*.tmp`, `cache/*.bin`), absolute ones must match the
+whole path. A pattern ending in `/` (e.g. `node_modules/`) names a
+directory and prunes that subtree.
+"""
+
+import os
+import re
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+# Case-insensitive filesystems compare names the way the OS does.
+_FLAGS = re.IGNORECASE if os.name == "nt" else 0
+
+
+def _translate_part(part: str) -> str:
+    # A single path component: `*` and `?` never cross a separator.
+    out = []
+    i, n = 0, len(part)
+    while i < n:
+        c = part[i]
+        i += 1
+        if c == "*":
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "[":
+            j = i
+            if j < n and part[j] in "!^":
+                j += 1
+            if j < n and part[j] == "]":
+                j += 1
+            while j < n and part[j] != "]":
+                j += 1
+            if j >= n:
+                out.append("\\[")
+            else:
+                body = part[i:j]
+                negate = body[:1] in ("!", "^")
+                if negate:
+                    body = body[1:]
+                # Only `-` ranges keep their meaning inside the class;
+                # escape what re would read as nested sets, set
+                # operations or escapes, as fnmatch.translate does.
+                body = re.sub(r"([\\\[\]^&~|])", r"\\\1", body)
+                out.append(f"[{'^' if negate else ''}{body}]")
+                i = j + 1
+        else:
+            out.append(re.escape(c))
+    return "".join(out)
+
+
+def _translate_glob(pattern: str) -> str:
+    pattern = pattern.replace("\\", "/")
+    anchored = pattern.startswith("/")
+    parts = [p for p in pattern.split("/") if p]
+    body = "/".join(_translate_part(p) for p in parts)
+    return f"^/{body}$" if anchored else f"(?:^|/){body}$"
+
+
+def compile_globs(patterns: Iterable[str]) -> Optional["re.Pattern"]:
+    """Combine glob patterns into one regex (None if there are none)."""
+    parts = [_translate_glob(p) for p in patterns if p and p.strip("/")]
+    if not parts:
+        return None
+    return re.compile("|".join(f"(?:{p})" for p in parts), _FLAGS)
+
+
+class SkipRules:
+
+    def __init__(
+        self,
+        root_dir: Path,
+        dest_root: Path,
+        protected_names: Iterable[str] = (),
+        include_hidden: bool = False,
+        exclude_patterns: Optional[List[str]] = None,
+        bookkeeping_names: Iterable[str] = (),
+    ):
+        self.include_hidden = include_hidden
+        self.bookkeeping_names = frozenset(bookkeeping_names)
+
+        self.protected_dirs = frozenset(
+            os.path.normcase(os.path.join(str(dest_root), name)) for name in protected_names
+        )
+
+        file_patterns, dir_patterns = [], []
+        for pat in exclude_patterns or []:
+            (dir_patterns if pat.endswith("/") else file_patterns).append(pat)
+        self._file_re = compile_globs(file_patterns)
+        self._dir_re = compile_globs(dir_patterns)
+
+        # Sorting *from inside* a category folder: everything under
+        # root_dir is already sorted, so the whole walk is a no-op.
+        root_norm = os.path.normcase(str(root_dir))
+        self.root_protected = any(
+            root_norm == d or root_norm.startswith(d + os.sep) for d in self.protected_dirs
+        )
+
+    @staticmethod
+    def _as_posix(path: str) -> str:
+        return path.replace(os.sep, "/") if os.sep != "/" else path
+
+    def prune_dir(self, entry) -> bool:
+        if not self.include_hidden and entry.name.startswith("."):
+            return True
+        if entry.name in self.bookkeeping_names:
+            return True
+        if self.protected_dirs and os.path.normcase(entry.path) in self.protected_dirs:
+            return True
+        if self._dir_re is not None and self._dir_re.search(self._as_posix(entry.path)):
+            return True
+        return False
+
+    def skip_file(self, entry) -> bool:
+        name = entry.name
+        if not self.include_hidden and name.startswith("."):
+            return True
+        if name in self.bookkeeping_names:
+            return True
+        if self._file_re is not None and self._file_re.search(self._as_posix(entry.path)):
+            return True
+        return False
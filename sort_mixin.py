@@ -6,7 +6,7 @@ thread-safe ui_queue (see ui_queue_mixin.py for why this matters).
 Additional fixes:
 1. Threading safety (Variable reads): all tkinter Variable reads
    (preserve_structure, dry_run, include_hidden, compute_duplicates,
-   include_suffixes) used to happen *inside* the background worker
+   hash_algorithm, include_suffixes) used to happen *inside* the background worker
    thread. Tkinter variables must only be read from the main thread.
    All values are now read on the main thread inside on_sort() and
    passed into the worker as plain arguments.
@@ -17,6 +17,13 @@ Additional fixes:
      - throttling preview refresh *requests* to a few times per
        second (on top of the natural coalescing the shared UI
        queue poller already does)
+3. Nothing visible during long scans: the sort runs in pipeline
+   mode, so files start moving while the scan is still going. Until
+   the scan finishes the total is open-ended, and the progress bar
+   switches to an indeterminate display instead of a percentage.
+4. Progress used to be one ui_queue message per file. The worker now
+   takes sort_directory's throttled ProgressEvents (phase, files/s,
+   MiB/s, ETA) and the status label shows them as they come.
 """
 
 import threading
@@ -81,6 +88,7 @@ class SortMixin:
             "dry_run": self.dry_run.get(),
             "include_hidden": self.include_hidden.get(),
             "compute_duplicates": self.compute_duplicates.get(),
+            "hash_algorithm": self.hash_algorithm.get(),
             "suffix_filter": [
                 s.strip().lower()
                 for s in self.include_suffixes.get().split(",")
@@ -101,16 +109,17 @@ class SortMixin:
 
         self._enqueue_log(f"▶ Starting sorting: {folder}")
 
-        def progress_cb(processed, total):
+        def progress_cb(event):
 
-            pct = int((processed / total) * 100) if total else 100
-            self.ui_queue.put(("progress", pct))
+            # Already throttled by the core (a few events per second),
+            # so every event can go straight onto the UI queue.
+            self.ui_queue.put(("progress_event", event))
 
-            now = time.monotonic()
-
-            if now - self._last_preview_refresh_ts >= PREVIEW_REFRESH_INTERVAL:
-                self._last_preview_refresh_ts = now
-                self.ui_queue.put(("refresh", None))
+            if event.phase == "moving":
+                now = time.monotonic()
+                if now - self._last_preview_refresh_ts >= PREVIEW_REFRESH_INTERVAL:
+                    self._last_preview_refresh_ts = now
+                    self.ui_queue.put(("refresh", None))
 
         try:
 
@@ -124,8 +133,10 @@ class SortMixin:
                 min_size_bytes=0,
                 max_size_bytes=None,
                 compute_duplicates=options["compute_duplicates"],
-                progress_callback=progress_cb,
-                suffix_filter=options["suffix_filter"]
+                on_progress=progress_cb,
+                suffix_filter=options["suffix_filter"],
+                pipeline=True,
+                hash_algorithm=options["hash_algorithm"]
             )
 
             moved = summary["moved_count"]
@@ -0,0 +1,135 @@
+"""
+Persistent size index of everything already sorted under dest_root,
+used by incremental duplicate detection.
+
+Why this exists:
+The duplicate pass used to re-walk and re-stat the whole of dest_root
+after every sort, even when only a handful of files had arrived. A
+new file can only duplicate an existing file of exactly the same
+size, so with an index of (path, size) for the sorted archive the
+incremental pass only has to:
+
+  1. look up the sizes of this run's files in the index
+  2. re-stat just those same-size peers (dropping vanished ones)
+  3. hand new files + peers to DuplicateFinder (the HashCache makes
+     the peers' digests free)
+
+so its cost scales with the delta, not with the archive.
+
+The index lives in `.sorted_index.sqlite` next to the sort history.
+A full (non-incremental) duplicate pass rebuilds it from its own
+scan; an incremental pass builds it once if it's missing or was made
+with different hidden-file rules. Files dropped into dest_root by
+hand are only picked up by the next full pass.
+"""
+
+import os
+import sqlite3
+import logging
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+from walker import FileRecord
+
+logger = logging.getLogger("smart_organizer")
+
+SORTED_INDEX_FILE = ".sorted_index.sqlite"
+SORTED_INDEX_FILES = (SORTED_INDEX_FILE, SORTED_INDEX_FILE + "-journal")
+
+_SCHEMA_VERSION = 1
+
+
+def stat_record(path: Path) -> Optional[FileRecord]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return FileRecord(str(path), os.path.basename(path), st.st_size, st.st_mtime_ns, st.st_ino, st.st_dev)
+
+
+class SortedIndex:
+
+    def __init__(self, path: Path, include_hidden: bool = False):
+        self.path = Path(path)
+        self.include_hidden = include_hidden
+        self.stats = {"peers_checked": 0, "stale_removed": 0}
+        try:
+            self._db = self._connect()
+        except sqlite3.DatabaseError as e:
+            logger.warning("Sorted index unreadable (%s), recreating %s", e, self.path)
+            try:
+                self.path.unlink()
+            except OSError:
+                pass
+            self._db = self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(str(self.path))
+        if db.execute("PRAGMA user_version").fetchone()[0] != _SCHEMA_VERSION:
+            db.execute("DROP TABLE IF EXISTS files")
+            db.execute("DROP TABLE IF EXISTS meta")
+            db.execute("CREATE TABLE files (path TEXT PRIMARY KEY, size INTEGER NOT NULL)")
+            db.execute("CREATE INDEX files_size ON files (size)")
+            db.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+            db.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+            db.commit()
+        return db
+
+    # ----------------------------------------------------
+    # STATE
+    # ----------------------------------------------------
+
+    @property
+    def needs_rebuild(self) -> bool:
+        row = self._db.execute("SELECT value FROM meta WHERE key='include_hidden'").fetchone()
+        return row is None or row[0] != str(int(self.include_hidden))
+
+    def rebuild(self, records: Iterable[FileRecord]):
+        self._db.execute("DELETE FROM files")
+        self._db.executemany("INSERT OR REPLACE INTO files VALUES (?, ?)", ((r.path, r.size) for r in records))
+        self._db.execute(
+            "INSERT OR REPLACE INTO meta VALUES ('include_hidden', ?)", (str(int(self.include_hidden)),)
+        )
+
+    def add(self, records: Iterable[FileRecord]):
+        self._db.executemany("INSERT OR REPLACE INTO files VALUES (?, ?)", ((r.path, r.size) for r in records))
+
+    def rename(self, moves: Iterable[Tuple[str, str]]):
+        self._db.executemany("UPDATE OR REPLACE files SET path=? WHERE path=?", ((new, old) for old, new in moves))
+
+    def remove(self, paths: Iterable[str]):
+        self._db.executemany("DELETE FROM files WHERE path=?", ((p,) for p in paths))
+
+    # ----------------------------------------------------
+    # LOOKUP
+    # ----------------------------------------------------
+
+    def peers(self, sizes: Iterable[int], exclude: Iterable[str] = ()) -> List[FileRecord]:
+        """Fresh FileRecords for indexed files with any of `sizes`."""
+        exclude = set(exclude)
+        found, vanished = [], []
+        for size in set(sizes):
+            for (path,) in self._db.execute("SELECT path FROM files WHERE size=?", (size,)).fetchall():
+                if path in exclude:
+                    continue
+                self.stats["peers_checked"] += 1
+                rec = stat_record(Path(path))
+                if rec is None:
+                    vanished.append(path)
+                elif rec.size != size:
+                    # Changed since it was indexed -- just re-file it.
+                    self.stats["stale_removed"] += 1
+                    self.add([rec])
+                else:
+                    found.append(rec)
+        if vanished:
+            self.stats["stale_removed"] += len(vanished)
+            self.remove(vanished)
+        return found
+
+    def close(self, commit: bool = True):
+        # Nothing is committed before this point, so commit=False
+        # rolls back every change made through this instance.
+        if commit:
+            self._db.commit()
+        self._db.close()
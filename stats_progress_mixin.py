@@ -2,6 +2,8 @@
 StatsProgressMixin: updates the stat cards and the progress bar/label.
 """
 
+from progress import format_event
+
 
 class StatsProgressMixin:
 
@@ -15,14 +17,54 @@ class StatsProgressMixin:
         self.stats_moved.config(text=str(moved))
         self.stats_duplicates.config(text=str(dup))
 
-    def _update_progress(self, pct):
+    def _set_progress_mode(self, mode):
+
+        if str(self.progress.cget("mode")) == mode:
+            return
+
+        if mode == "indeterminate":
+            self.progress.config(mode="indeterminate")
+            self.progress.start(15)
+        else:
+            self.progress.stop()
+            self.progress.config(mode="determinate")
+
+    def _update_progress_event(self, event):
 
+        # Total still unknown (pipeline scan running): animate the bar
+        # rather than show a percentage that would keep jumping back.
+        fraction = event.fraction
+        if fraction is None:
+            self._set_progress_mode("indeterminate")
+            self.progress_percent.config(text=f"{event.processed:,}+")
+        else:
+            pct = int(fraction * 100)
+            self._set_progress_mode("determinate")
+            self.progress_value.set(pct)
+            self.progress_percent.config(text=f"{pct}%")
+        self.status_label.config(text=format_event(event))
+
+    def _update_replay_progress(self, label, done, total):
+
+        pct = int((done / total) * 100) if total else 100
+        self._set_progress_mode("determinate")
         self.progress_value.set(pct)
         self.progress_percent.config(text=f"{pct}%")
-        self.status_label.config(text=f"Organizing files... {pct}%")
+        self.status_label.config(text=f"{label}... {done:,} / {total:,}")
+
+    def _finish_replay(self, label):
+
+        self._set_progress_mode("determinate")
+        self.progress_value.set(100)
+        self.progress_percent.config(text="100%")
+        self.status_label.config(text=f"{label} completed ✓")
+
+        self.root.after(1200, lambda: self.progress_value.set(0))
+        self.root.after(1200, lambda: self.progress_percent.config(text="0%"))
 
     def _finish_sort(self):
 
+        self._set_progress_mode("determinate")
         self.progress_value.set(100)
         self.progress_percent.config(text="100%")
 
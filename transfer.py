@@ -0,0 +1,404 @@
+"""
+Moving one file's bytes: a plain rename when source and destination
+share a filesystem, a kernel-side copy when they don't.
+
+Why this exists:
+move_file() used to hand every file to `shutil.move`, which tries a
+rename and, on EXDEV, falls back to copy2() + unlink. With dest_root
+on another volume that meant a userspace copy loop per file, an
+unconditional first rename attempt that is known to fail, and no
+fsync before the source was deleted.
+
+Transfer decides per (source dir, destination dir) pair, using st_dev
+cached per directory, so the device check costs two stats per folder
+rather than per file:
+
+  - same device  -> os.rename()
+  - other device -> copy, trying in order
+        reflink (FICLONE ioctl: btrfs, XFS, bcachefs -- no data copied)
+        os.copy_file_range() (in-kernel; server-side on NFS 4.2 / SMB)
+        os.sendfile()
+        a buffered read/write loop
+    then verify the copied size, fsync, copy metadata (copystat) and
+    only then unlink the source
+
+A Transfer lives for one run and also caches, per directory, whether
+it has been created (ensure_dir) and what it resolves to (same_file),
+so thousands of files landing in one folder cost one mkdir and one
+realpath. Where the OS supports it, renames and existence checks are
+made relative to open directory descriptors (a small per-thread LRU),
+so deep preserve_structure paths aren't re-walked component by
+component on every file. All threads and runs share one budget for
+those descriptors, a quarter of RLIMIT_NOFILE; when it is used up, or
+the process runs out of descriptors anyway (EMFILE / ENFILE), moves
+fall back to plain path-based calls instead of failing.
+
+Symlinks and anything that isn't a regular file still go through
+shutil.move (counted as "other"). `stats` counts renames vs. copies and the bytes/seconds
+spent copying, for the sort summary.
+"""
+
+import os
+import time
+import errno
+import shutil
+import logging
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+logger = logging.getLogger("smart_organizer")
+
+# linux/fs.h: _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+COPY_CHUNK = 64 * 1024 * 1024
+BUFFER_SIZE = 1024 * 1024
+
+# Open directory descriptors kept per worker thread...
+MAX_DIR_FDS = 64
+# ...and by all threads together, as a share of the soft RLIMIT_NOFILE;
+# the rest is left for the files being copied, SQLite, logs and the
+# embedding application.
+DIR_FD_SHARE = 4
+DIR_FD_BUDGET_MAX = 4096
+DIR_FD_SUPPORTED = (
+    hasattr(os, "O_DIRECTORY") and os.rename in os.supports_dir_fd and os.stat in os.supports_dir_fd
+)
+
+_OUT_OF_FDS = {errno.EMFILE, errno.ENFILE}
+
+# Errors meaning "this copy method isn't available here", not "the copy failed".
+_UNSUPPORTED = {
+    errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTTY,
+    getattr(errno, "ENOTSUP", errno.EOPNOTSUPP), errno.EBADF, errno.EPERM,
+}
+
+
+def _reflink(src_fd: int, dst_fd: int, size: int) -> int:
+    if fcntl is None:
+        raise OSError(errno.ENOSYS, "reflink unsupported")
+    fcntl.ioctl(dst_fd, FICLONE, src_fd)
+    return size
+
+
+def _copy_file_range(src_fd: int, dst_fd: int, size: int) -> int:
+    if not hasattr(os, "copy_file_range"):
+        raise OSError(errno.ENOSYS, "copy_file_range unsupported")
+    copied = 0
+    while copied < size:
+        n = os.copy_file_range(src_fd, dst_fd, min(COPY_CHUNK, size - copied))
+        if n == 0:
+            if copied == 0:
+                # procfs, some FUSE mounts and older kernels return 0
+                # instead of an error; let the next method copy it.
+                raise OSError(errno.EOPNOTSUPP, "copy_file_range copied nothing")
+            break
+        copied += n
+    return copied
+
+
+def _sendfile(src_fd: int, dst_fd: int, size: int) -> int:
+    if not hasattr(os, "sendfile"):
+        raise OSError(errno.ENOSYS, "sendfile unsupported")
+    copied = 0
+    while copied < size:
+        n = os.sendfile(dst_fd, src_fd, copied, min(COPY_CHUNK, size - copied))
+        if n == 0:
+            if copied == 0:
+                raise OSError(errno.EOPNOTSUPP, "sendfile copied nothing")
+            break
+        copied += n
+    return copied
+
+
+def _buffered(src_fd: int, dst_fd: int, size: int) -> int:
+    copied = 0
+    while True:
+        chunk = os.read(src_fd, BUFFER_SIZE)
+        if not chunk:
+            return copied
+        view = memoryview(chunk)
+        written = 0
+        while written < len(chunk):
+            written += os.write(dst_fd, view[written:])
+        copied += len(chunk)
+
+
+COPY_METHODS = (
+    ("reflink", _reflink),
+    ("copy_file_range", _copy_file_range),
+    ("sendfile", _sendfile),
+    ("buffered", _buffered),
+)
+
+
+def copy_file(src: str, dst: str) -> Tuple[str, int]:
+    """
+    Copy regular file `src` to new file `dst` (which must not exist)
+    with the fastest method that works; returns (method, bytes). The
+    copy is size-verified and fsync'd; a failed copy leaves no `dst`.
+    """
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+    src_fd = os.open(src, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        size = os.fstat(src_fd).st_size
+        dst_fd = os.open(dst, flags, 0o666)
+        try:
+            try:
+                for method, func in COPY_METHODS:
+                    try:
+                        copied = func(src_fd, dst_fd, size)
+                    except OSError as e:
+                        if e.errno not in _UNSUPPORTED or method == "buffered":
+                            raise
+                        # Start the next method from a clean slate.
+                        os.lseek(src_fd, 0, os.SEEK_SET)
+                        os.lseek(dst_fd, 0, os.SEEK_SET)
+                        os.ftruncate(dst_fd, 0)
+                        continue
+                    break
+                if copied != size or os.fstat(dst_fd).st_size != size:
+                    raise OSError(errno.EIO, f"Short copy ({copied} of {size} bytes)", dst)
+                os.fsync(dst_fd)
+            finally:
+                os.close(dst_fd)
+            # Once closed, so the close can't touch the copied times.
+            shutil.copystat(src, dst)
+        except BaseException:
+            try:
+                os.unlink(dst)
+            except OSError:
+                pass
+            raise
+    finally:
+        os.close(src_fd)
+    return method, size
+
+
+def _dir_fd_budget() -> int:
+    soft = None
+    if resource is not None:
+        try:
+            soft = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+        except (OSError, ValueError):
+            pass
+    if soft is None or soft == getattr(resource, "RLIM_INFINITY", -1) or soft <= 0:
+        return DIR_FD_BUDGET_MAX
+    return min(DIR_FD_BUDGET_MAX, soft // DIR_FD_SHARE)
+
+
+class _FdBudget:
+    """How many directory descriptors may be cached, process-wide."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> bool:
+        with self._lock:
+            if self.used >= self.limit:
+                return False
+            self.used += 1
+            return True
+
+    def release(self, n: int = 1):
+        with self._lock:
+            self.used -= n
+
+
+_budget = _FdBudget(_dir_fd_budget())
+
+
+class _DirFds:
+    """A small per-thread LRU of open directory descriptors."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.fds: "OrderedDict[str, int]" = OrderedDict()
+
+    def get(self, directory: str) -> Optional[int]:
+        """An open fd for `directory`, or None to use its path instead."""
+        fd = self.fds.get(directory)
+        if fd is not None:
+            self.fds.move_to_end(directory)
+            return fd
+        if len(self.fds) >= self.limit or not _budget.acquire():
+            if not self.fds:
+                return None
+            # Reuse the least recently used descriptor's budget slot.
+            os.close(self.fds.popitem(last=False)[1])
+        try:
+            fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        except OSError as e:
+            _budget.release()
+            if e.errno in _OUT_OF_FDS:
+                return None
+            raise
+        self.fds[directory] = fd
+        return fd
+
+    def close(self):
+        n = len(self.fds)
+        while self.fds:
+            os.close(self.fds.popitem()[1])
+        _budget.release(n)
+
+
+class Transfer:
+
+    def __init__(self):
+        self._devices: Dict[str, int] = {}
+        self._created: Set[str] = set()
+        self._resolved: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._fd_caches: List[_DirFds] = []
+        self.stats = {
+            "renamed": 0,
+            "copied": 0,
+            "other": 0,
+            "bytes_copied": 0,
+            "copy_seconds": 0.0,
+            "methods": {},
+        }
+
+    # ----------------------------------------------------
+    # DIRECTORY CACHES
+    # ----------------------------------------------------
+
+    def ensure_dir(self, directory: Path):
+        """mkdir -p, once per directory per run."""
+        key = str(directory)
+        if key in self._created:
+            return
+        os.makedirs(key, exist_ok=True)
+        with self._lock:
+            self._created.add(key)
+
+    def resolve_dir(self, directory: str) -> str:
+        resolved = self._resolved.get(directory)
+        if resolved is None:
+            resolved = os.path.realpath(directory)
+            with self._lock:
+                self._resolved[directory] = resolved
+        return resolved
+
+    def same_file(self, src: Path, dst: Path) -> bool:
+        """`src.resolve() == dst.resolve()`, resolving each folder only once."""
+        a, b = str(src), str(dst)
+        return os.path.normcase(os.path.join(self.resolve_dir(os.path.dirname(a)), os.path.basename(a))) == \
+            os.path.normcase(os.path.join(self.resolve_dir(os.path.dirname(b)), os.path.basename(b)))
+
+    def _fds(self) -> Optional[_DirFds]:
+        if not DIR_FD_SUPPORTED:
+            return None
+        fds = getattr(self._local, "fds", None)
+        if fds is None:
+            fds = self._local.fds = _DirFds(MAX_DIR_FDS)
+            with self._lock:
+                self._fd_caches.append(fds)
+        return fds
+
+    def lexists(self, path: Path) -> bool:
+        fds = self._fds()
+        if fds is None:
+            return os.path.lexists(path)
+        directory, name = os.path.split(str(path))
+        try:
+            os.lstat(name, dir_fd=fds.get(directory))
+            return True
+        except OSError:
+            return False
+
+    def _device(self, directory: str, fd: Optional[int] = None) -> int:
+        dev = self._devices.get(directory)
+        if dev is None:
+            dev = (os.fstat(fd) if fd is not None else os.stat(directory)).st_dev
+            with self._lock:
+                self._devices[directory] = dev
+        return dev
+
+    def close(self):
+        """Close every cached directory descriptor (call once moves are done)."""
+        with self._lock:
+            caches, self._fd_caches = self._fd_caches, []
+        for fds in caches:
+            fds.close()
+        self._local = threading.local()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def move(self, src: Path, dst: Path):
+        """Move `src` to the not-yet-existing `dst`; its folder must exist."""
+        src_s, dst_s = str(src), str(dst)
+        src_dir, src_name = os.path.split(src_s)
+        dst_dir, dst_name = os.path.split(dst_s)
+        fds = self._fds()
+        src_fd = dst_fd = None
+        if fds is not None:
+            src_fd = fds.get(src_dir)
+            dst_fd = fds.get(dst_dir)
+            if dst_fd is not None and src_fd is not None and src_dir not in fds.fds:
+                # Opening dst_dir evicted src_dir's descriptor.
+                src_fd = None
+        if self._device(src_dir, src_fd) == self._device(dst_dir, dst_fd):
+            try:
+                if src_fd is not None and dst_fd is not None:
+                    # Relative to the open folders: no per-component
+                    # path walk of deep preserve_structure trees.
+                    os.rename(src_name, dst_name, src_dir_fd=src_fd, dst_dir_fd=dst_fd)
+                else:
+                    os.rename(src_s, dst_s)
+                self._count("renamed")
+                return
+            except OSError as e:
+                # Same st_dev but a different mount (bind mounts, some
+                # overlay setups) -- copy instead.
+                if e.errno != errno.EXDEV:
+                    raise
+        if os.path.islink(src_s) or not os.path.isfile(src_s):
+            shutil.move(src_s, dst_s)
+            self._count("other")
+            return
+        start = time.perf_counter()
+        try:
+            method, size = copy_file(src_s, dst_s)
+        except OSError as e:
+            if e.errno not in _OUT_OF_FDS or fds is None:
+                raise
+            # Out of descriptors: hand back this thread's cached folders
+            # and try once more.
+            fds.close()
+            method, size = copy_file(src_s, dst_s)
+        os.unlink(src_s)
+        with self._lock:
+            self.stats["copied"] += 1
+            self.stats["bytes_copied"] += size
+            self.stats["copy_seconds"] += time.perf_counter() - start
+            self.stats["methods"][method] = self.stats["methods"].get(method, 0) + 1
+
+    def summary(self) -> dict:
+        stats = dict(self.stats, methods=dict(self.stats["methods"]))
+        seconds = stats["copy_seconds"]
+        stats["copy_bytes_per_second"] = stats["bytes_copied"] / seconds if seconds > 0 else 0.0
+        return stats
@@ -41,6 +41,7 @@ class UIQueueMixin:
         latest_stats = None
         want_refresh = False
         sort_done = False
+        replay_done = None
 
         while True:
 
@@ -49,8 +50,8 @@ class UIQueueMixin:
             except queue.Empty:
                 break
 
-            if kind == "progress":
-                latest_progress = payload
+            if kind in ("progress_event", "replay_progress"):
+                latest_progress = (kind, payload)
 
             elif kind == "stats":
                 latest_stats = payload
@@ -61,8 +62,15 @@ class UIQueueMixin:
             elif kind == "sort_done":
                 sort_done = True
 
+            elif kind == "replay_done":
+                replay_done = payload
+
         if latest_progress is not None:
-            self._update_progress(latest_progress)
+            kind, payload = latest_progress
+            if kind == "replay_progress":
+                self._update_replay_progress(*payload)
+            else:
+                self._update_progress_event(payload)
 
         if latest_stats is not None:
             self._update_stats(*latest_stats)
@@ -70,6 +78,9 @@ class UIQueueMixin:
         if want_refresh:
             self.refresh_preview()
 
+        if replay_done is not None:
+            self._finish_replay(replay_done)
+
         if sort_done:
             self._finish_sort()
             self._resume_watchdog_after_sort()
@@ -6,6 +6,10 @@ Fix: these workers used to call `self.root.after(0, ...)` directly
 from a background thread to push stats/preview updates. That is not
 reliably thread-safe (see ui_queue_mixin.py). Now they push into the
 shared, thread-safe ui_queue instead, which the main thread drains.
+
+Both run on the parallel, resumable replay engine (replay.py) and
+report real per-file progress through "replay_progress" messages; an
+interrupted undo/redo is picked up where it stopped on the next click.
 """
 
 import threading
@@ -13,6 +17,8 @@ from pathlib import Path
 from tkinter import messagebox
 
 from file_sorter import undo, redo
+from replay import DEFAULT_REPLAY_WORKERS
+from progress import ReplayProgress
 from logging_setup import logger
 
 
@@ -47,7 +53,16 @@ class UndoRedoMixin:
 
         try:
 
-            result = undo(dest_root)
+            # Throttled: one ui_queue message per PROGRESS_INTERVAL,
+            # not one per file.
+            progress_cb = ReplayProgress(
+                lambda e: self.ui_queue.put(("replay_progress", ("Undoing", e.processed, e.total))), "undoing"
+            )
+
+            result = undo(dest_root, workers=DEFAULT_REPLAY_WORKERS, progress_callback=progress_cb)
+
+            if result.get("resumed"):
+                self._enqueue_log("Resumed an interrupted undo/redo")
 
             if result.get("errors"):
                 for error in result["errors"]:
@@ -61,6 +76,7 @@ class UndoRedoMixin:
 
             self.ui_queue.put(("stats", (0, 0, 0)))
             self.ui_queue.put(("refresh", None))
+            self.ui_queue.put(("replay_done", "Undo"))
 
         except Exception as e:
 
@@ -88,7 +104,14 @@ class UndoRedoMixin:
 
         try:
 
-            result = redo(dest_root)
+            progress_cb = ReplayProgress(
+                lambda e: self.ui_queue.put(("replay_progress", ("Redoing", e.processed, e.total))), "redoing"
+            )
+
+            result = redo(dest_root, workers=DEFAULT_REPLAY_WORKERS, progress_callback=progress_cb)
+
+            if result.get("resumed"):
+                self._enqueue_log("Resumed an interrupted undo/redo")
 
             if result.get("errors"):
                 for error in result["errors"]:
@@ -102,6 +125,7 @@ class UndoRedoMixin:
 
             self.ui_queue.put(("stats", (0, 0, 0)))
             self.ui_queue.put(("refresh", None))
+            self.ui_queue.put(("replay_done", "Redo"))
 
         except Exception as e:
 
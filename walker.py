@@ -0,0 +1,116 @@
+"""
+Single-pass filesystem walker used by every scan in file_sorter.py
+(the sort pass and the duplicate pass).
+
+Why this exists:
+`Path.rglob("*")` followed by `p.is_dir()` and `p.stat()` costs a
+fresh Path object plus several syscalls per entry. `os.scandir`
+already knows each entry's type from the directory listing itself,
+and `DirEntry.stat()` caches its result, so one walk gives us
+everything the sorter needs (path, size, mtime, inode) with a single
+stat per file and no per-entry Path construction.
+
+The walk is iterative (explicit stack, no recursion limit on deep
+trees) and only ever keeps one directory handle open at a time.
+Symlinked directories are not followed, to avoid cycles.
+"""
+
+import os
+import logging
+from typing import Callable, Iterator, Optional
+
+logger = logging.getLogger("smart_organizer")
+
+
+class FileRecord:
+    """
+    Lightweight, immutable-by-convention record for one scanned file.
+    `path` is kept as a plain string; callers build a Path only for
+    the files they actually act on.
+    """
+
+    __slots__ = ("path", "name", "size", "mtime_ns", "inode", "dev")
+
+    def __init__(self, path: str, name: str, size: int, mtime_ns: int, inode: int, dev: int):
+        self.path = path
+        self.name = name
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.inode = inode
+        self.dev = dev
+
+    @property
+    def mtime(self) -> float:
+        return self.mtime_ns / 1_000_000_000
+
+    @property
+    def cache_key(self):
+        """(dev, inode, size, mtime_ns) -- identifies this exact file version."""
+        return self.dev, self.inode, self.size, self.mtime_ns
+
+    @property
+    def suffix(self) -> str:
+        # Same semantics as Path.suffix: a leading dot (".bashrc")
+        # or a trailing dot ("file.") is not an extension.
+        i = self.name.rfind(".")
+        if 0 < i < len(self.name) - 1:
+            return self.name[i:]
+        return ""
+
+    def __repr__(self):
+        return f"FileRecord({self.path!r}, size={self.size})"
+
+
+def walk_files(
+    root,
+    prune_dir: Optional[Callable[[os.DirEntry], bool]] = None,
+    skip_file: Optional[Callable[[os.DirEntry], bool]] = None,
+    counters: Optional[dict] = None,
+) -> Iterator[FileRecord]:
+    """
+    Yield a FileRecord for every non-directory entry under `root`.
+
+    `prune_dir(entry)` returning True stops the walk from descending
+    into that directory at all; `skip_file(entry)` returning True
+    drops a file before it is stat()ed.
+
+    If given, `counters["dirs_listed"]` and `counters["stat_calls"]`
+    are increased by what the walk did, once it finishes or is closed.
+    """
+    dirs_listed = stat_calls = 0
+    try:
+        stack = [os.fspath(root)]
+        while stack:
+            current = stack.pop()
+            try:
+                it = os.scandir(current)
+                dirs_listed += 1
+            except OSError as e:
+                logger.debug("Scan error %s: %s", current, e)
+                continue
+            subdirs = []
+            with it:
+                for entry in it:
+                    try:
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    if is_dir:
+                        if prune_dir is None or not prune_dir(entry):
+                            subdirs.append(entry.path)
+                        continue
+                    if skip_file is not None and skip_file(entry):
+                        continue
+                    stat_calls += 1
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        # Broken symlink, or removed since the listing.
+                        continue
+                    yield FileRecord(entry.path, entry.name, st.st_size, st.st_mtime_ns, st.st_ino, st.st_dev)
+            # Reversed so directories are visited in listing order.
+            stack.extend(reversed(subdirs))
+    finally:
+        if counters is not None:
+            counters["dirs_listed"] = counters.get("dirs_listed", 0) + dirs_listed
+            counters["stat_calls"] = counters.get("stat_calls", 0) + stat_calls